@@ -1,3 +1,9 @@
+from .acceleration import Anderson, Relaxation
 from .base import MDP
+from .checkpoint import Checkpoint
+from .indexer import StateIndexer
+from .model_cache import ModelCache
+from .sparse import SparseTransitions, truncate
+from .telemetry import SolverMetrics, SweepRecord
 
-__all__ = ["MDP",]
\ No newline at end of file
+__all__ = ["MDP", "Anderson", "Relaxation", "Checkpoint", "StateIndexer", "ModelCache", "SparseTransitions", "truncate", "SolverMetrics", "SweepRecord",]
\ No newline at end of file
@@ -0,0 +1,120 @@
+from collections import deque
+import numpy as np
+
+class Accelerator:
+	# extrapolates a plain sweep x -> T(x) towards the fixed point, but only
+	# while plain sweeps are slow, shrinking the residual by a factor of at
+	# least min_rate each: faster ones leave little to gain, and on the
+	# undiscounted Gambler's problem any overshoot costs more than it saves.
+	# An extrapolated run must keep the residual below where plain sweeps
+	# would have taken it by then; otherwise the iterate goes back to the
+	# plain sweep from the best point seen and the next `cooldown` sweeps are
+	# plain, twice as many after each rejection until a step pays off again
+	def __init__(self, min_rate=.8, cooldown=2):
+		assert(0 <= min_rate <= 1)
+		assert(cooldown >= 1)
+		self.min_rate = min_rate
+		self.cooldown = cooldown
+		self.accepted = 0
+		self.rejected = 0
+		self.reset()
+
+	def reset(self):
+		self.residual = np.inf
+		self.rate = 0.
+		self.bench = np.inf
+		self.best = np.inf
+		self.fallback = None
+		self.extrapolated = False
+		self.plain = 0
+		self.wait = self.cooldown
+
+	def step(self, V, TV):
+		residual = np.max(np.abs(TV - V))
+		if self.extrapolated:
+			# the residual plain sweeps would have reached by now
+			self.bench *= self.rate
+			if residual > self.bench:
+				self.rejected += 1
+				self.extrapolated = False
+				self.plain = self.wait
+				self.wait *= 2
+				self.residual = self.best
+				self.restart()
+				return self.fallback
+			self.wait = self.cooldown
+		else:
+			# contraction of the last plain sweep
+			if np.isfinite(self.residual) and self.residual > 0:
+				self.rate = min(residual / self.residual, 1.)
+			self.bench = residual
+		self.residual = residual
+		if residual <= self.best:
+			self.best = residual
+			self.fallback = TV
+
+		if self.plain > 0 or self.rate < self.min_rate:
+			self.plain = max(self.plain - 1, 0)
+			return TV
+
+		new_V = self.extrapolate(V, TV)
+		self.extrapolated = new_V is not TV
+		if self.extrapolated:
+			self.accepted += 1
+
+		return new_V
+
+	def restart(self):
+		pass
+
+	def extrapolate(self, V, TV):
+		return TV
+
+class Relaxation(Accelerator):
+	# successive over-relaxation: x + omega * (T(x) - x)
+	def __init__(self, omega=1.5, min_rate=.8, cooldown=2):
+		assert(0 < omega < 2)
+		self.omega = omega
+		super().__init__(min_rate, cooldown)
+
+	def extrapolate(self, V, TV):
+		return V + self.omega * (TV - V)
+
+class Anderson(Accelerator):
+	# type-II Anderson mixing over the last `window` sweeps: the new iterate
+	# combines past T(x) with the weights that best cancel their residuals
+	def __init__(self, window=5, regularization=1e-10, min_rate=.8, cooldown=2):
+		assert(window >= 1)
+		self.window = window
+		self.regularization = regularization
+		super().__init__(min_rate, cooldown)
+
+	def reset(self):
+		super().reset()
+		self.restart()
+
+	def restart(self):
+		self.last = None
+		self.dF = deque(maxlen=self.window)
+		self.dG = deque(maxlen=self.window)
+
+	def extrapolate(self, V, TV):
+		F = TV - V
+		if self.last is not None:
+			self.dF.append(F - self.last[0])
+			self.dG.append(TV - self.last[1])
+		self.last = (F, TV)
+
+		if not self.dF:
+			return TV
+
+		dF = np.stack(self.dF, axis=1)
+		dG = np.stack(self.dG, axis=1)
+		A = dF.T @ dF
+		scale = np.trace(A)
+		if scale == 0:
+			return TV
+
+		weights = np.linalg.solve(A + self.regularization * scale * np.eye(len(A)), dF.T @ F)
+
+		return TV - dG @ weights
@@ -1,108 +1,591 @@
 from abc import ABC, abstractmethod
-from itertools import product
+from collections.abc import Mapping
 from random import choice
+from heapq import heappush, heappop
+from time import perf_counter
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
 import numpy as np
+from .parallel import ShardedBackend
+from .indexer import StateIndexer, ValueView, PolicyView
+from .checkpoint import Checkpoint
+from .telemetry import SweepTimer
 
-METHODS = ["sync", "value_iter"]
+METHODS = ["sync", "value_iter", "gauss_seidel", "prioritized", "eliminate"]
+EVAL_METHODS = ["sync", "exact", "modified"]
+# relative round-off under which policy iteration treats an action as tied
+# with the current one
+TIE_TOL = 1e-10
 
 class MDP(ABC):
+	methods = METHODS
+
 	def __init__(self, states_dim, actions, eps, verbose):
-		ranges = []
-		for dim in states_dim:
-			ranges.append(range(dim))
-		self.states = list(product(*ranges))
-		self.policy = {}
-		self.value_state = {}
-		self.action_value = {}
-		self.num_states = len(self.states)
+		self.indexer = StateIndexer(states_dim)
+		self.states = self.indexer.states()
+		self.num_states = len(self.indexer)
+		self.action_index = {a: i for i, a in enumerate(actions)}
 
-		for i in range(self.num_states):
-			self.policy[self.states[i]] = choice(actions)
-			self.value_state[self.states[i]] = 0
+		self.V = np.zeros(self.num_states)
+		self.pi = np.array([self.action_index[choice(actions)] for i in range(self.num_states)])
+		self.value_state = ValueView(self)
+		self.policy = PolicyView(self)
 
 		self.actions = actions
 		self.eps = eps
 		self.val_it = 0
 		self.pol_it = 0
 		self.verbose = verbose
+		self.backups = 0
+		self.eval_stats = []
+		self.elimination_stats = []
+		self.compiled = False
+		self.sparse = False
+		self.checkpoint = None
+		self.callbacks = []
+		self.accelerator = None
+		self.warm = False
+
+	def compile(self, sparse=False, threshold=0.):
+		self.sparse = sparse
+		self.threshold = threshold
+		self.P, self.R = self.transition_model()
+		self.compiled = True
+
+	def policy_action(self, i):
+		if self.pi[i] < 0:
+			return self.policy.extra[i]
+
+		return self.actions[self.pi[i]]
+
+	def transition_model(self):
+		raise NotImplementedError("{0} does not export its dynamics".format(type(self).__name__))
+
+	def action_values(self, V):
+		return self.R + self.gamma * (self.P @ V)
+
+	def policy_transitions(self, pi):
+		if self.sparse:
+			return self.P.policy_matrix(pi)
+
+		return self.P[np.arange(self.num_states), pi]
+
+	def policy_values(self, V, pi):
+		rows = np.arange(self.num_states)
+		return self.R[rows, pi] + self.gamma * (self.policy_transitions(pi) @ V)
+
+	def shard_action_values(self, V, lo, hi):
+		if not self.compiled:
+			self.V = V
+			return np.array([[self.expected_returns(s, a) for a in self.actions]
+							 for s in self.states[lo:hi]])
+
+		if self.sparse:
+			return self.R[lo:hi] + self.gamma * self.P.shard_matmul(lo, hi, V)
+
+		return self.R[lo:hi] + self.gamma * (self.P[lo:hi] @ V)
+
+	def compiled_eval_policy(self):
+		self.backups += self.num_states
+		new_V = self.policy_values(self.V, self.pi)
+		delta = np.max(np.abs(new_V - self.V))
+		self.V = new_V
+
+		return delta
+
+	def compiled_improve_policy(self, keep_ties=False):
+		self.backups += self.num_states
+		Q = self.action_values(self.V)
+		rows = np.arange(self.num_states)
+		best = np.argmax(Q, axis=1)
+		current_val = None
+		if keep_ties:
+			current_val = np.where(self.pi >= 0, Q[rows, np.maximum(self.pi, 0)], -np.inf)
+
+		return self.greedy_update(Q[rows, best], best, current_val)
+
+	def greedy_update(self, best_val, best, current_val=None):
+		# same rule as the loop: keep the old action unless some action beats 0
+		new_pi = np.where(best_val > 0, best, self.pi)
+		if current_val is not None:
+			# or, in policy iteration, unless it beats the old action by more
+			# than round-off, else tied actions can swap back and forth forever
+			new_pi = np.where(current_val >= best_val - TIE_TOL * np.maximum(1, np.abs(best_val)), self.pi, new_pi)
+		changed = new_pi != self.pi
+
+		if self.verbose:
+			for i in np.flatnonzero(changed):
+				print("* {0:^16} * {1:^17} * {2:^17} * {3:^17.4f} *".format(
+					str(self.states[i]), self.policy_action(i), self.actions[new_pi[i]],
+					max(best_val[i], 0)))
+
+		self.pi = new_pi
+
+		return not changed.any()
+
+	def monotone(self):
+		# backups never lower a value, except under acceleration, which can
+		# overshoot, or from loaded values, which can start above the optimum;
+		# both have to be pulled back down
+		return self.accelerator is None and not self.warm
+
+	def backup_floor(self):
+		return self.V if self.monotone() else -np.inf
+
+	def compiled_value_iteration(self, delta):
+		self.backups += self.num_states
+		new_V = np.maximum(self.backup_floor(), np.max(self.action_values(self.V), axis=1))
+		delta = max(delta, np.max(np.abs(new_V - self.V)))
+		self.V = new_V
+
+		return delta
+
+	def state_action_values(self, i):
+		self.backups += 1
+		if not self.compiled:
+			state = self.states[i]
+			return np.array([self.expected_returns(state, a) for a in self.actions])
+
+		if self.sparse:
+			return self.R[i] + self.gamma * self.P.state_matmul(i, self.V)
+
+		return self.R[i] + self.gamma * (self.P[i] @ self.V)
+
+	def state_backup(self, i):
+		# same backup as value_iteration
+		floor = self.V[i] if self.monotone() else -np.inf
+		return max(floor, np.max(self.state_action_values(i)))
+
+	def sweep_order(self, order):
+		if order is None:
+			return np.arange(self.num_states)
+		if order == "reverse":
+			return np.arange(self.num_states)[::-1]
+		if order == "random":
+			return np.random.permutation(self.num_states)
+
+		return np.array([self.indexer.index(s) for s in order])
+
+	def transition_triples(self):
+		# (state, next state, probability) of every nonzero transition
+		if self.sparse:
+			states = np.repeat(self.P.states, np.diff(self.P.matrix.indptr))
+			return states, self.P.matrix.indices, self.P.matrix.data
+
+		states, actions, next_states = np.nonzero(self.P)
+		return states, next_states, self.P[states, actions, next_states]
+
+	def predecessors(self):
+		# pred[j, i] = max_a P(j | i, a), so a change d in V[j] moves the
+		# Bellman error of i by at most gamma * pred[j, i] * d
+		states, next_states, probs = self.transition_triples()
+		keys = next_states.astype(np.int64) * self.num_states + states
+		order = np.argsort(keys, kind="stable")
+		keys, start = np.unique(keys[order], return_index=True)
+		weights = np.maximum.reduceat(probs[order], start)
+
+		return sparse.csr_matrix((weights, (keys // self.num_states, keys % self.num_states)),
+								 shape=(self.num_states, self.num_states))
+
+	def gauss_seidel_sweep(self, delta, order=None):
+		for i in self.sweep_order(order):
+			old_val = self.V[i]
+			best_val = self.state_backup(i)
+			self.V[i] = best_val
+			delta = max(delta, np.abs(old_val - best_val))
+
+		return delta
+
+	def prioritized_sweeping(self, theta=0):
+		if not self.compiled:
+			self.compile()
+		pred = self.predecessors()
+
+		timer = SweepTimer(self) if self.callbacks else None
+		priority = np.zeros(self.num_states)
+		queue = []
+		for i in range(self.num_states):
+			priority[i] = abs(self.state_backup(i) - self.V[i])
+			if priority[i] > self.eps:
+				heappush(queue, (-priority[i], i))
+
+		pops = 0
+		while queue:
+			error, i = heappop(queue)
+			if -error != priority[i]:
+				continue
+
+			pops += 1
+			if pops % self.num_states == 0:
+				self.save_checkpoint(pops // self.num_states)
+				if timer is not None:
+					self.report(timer, "prioritized", pops // self.num_states)
+					timer = SweepTimer(self)
+
+			priority[i] = 0
+			old_val = self.V[i]
+			self.V[i] = self.state_backup(i)
+			change = abs(self.V[i] - old_val)
+			if change <= theta:
+				continue
+
+			lo, hi = pred.indptr[i], pred.indptr[i+1]
+			for p, weight in zip(pred.indices[lo:hi], pred.data[lo:hi]):
+				priority[p] += self.gamma * weight * change
+				if priority[p] > self.eps:
+					heappush(queue, (-priority[p], p))
+
+		if timer is not None and pops % self.num_states != 0:
+			self.report(timer, "prioritized", pops // self.num_states + 1)
+
+	def warm_start(self, source):
+		# values (and the policy, when the actions match) from a neighbouring
+		# problem; they can lie above the optimum, so the solve that follows
+		# lets backups lower them
+		if isinstance(source, MDP):
+			if source.actions == self.actions:
+				self.pi = source.pi.copy()
+			source = source.V
+		elif isinstance(source, Mapping):
+			source = [source[s] for s in self.states]
+
+		V = np.array(source, dtype=float)
+		if V.shape != self.V.shape:
+			raise ValueError("Warm start has shape {0}, expected {1}".format(V.shape, self.V.shape))
+		self.V = V
+		self.warm = True
+
+	def report(self, timer, kind, sweep):
+		record = timer.finish(self, kind, sweep)
+		for callback in self.callbacks:
+			callback(record)
+
+	def timed(self, kind, sweep, step, *args):
+		if not self.callbacks:
+			return step(*args)
+
+		timer = SweepTimer(self)
+		result = step(*args)
+		self.report(timer, kind, sweep)
+
+		return result
+
+	def accelerated(self, step, *args):
+		if self.accelerator is None:
+			return step(*args)
+
+		V = self.V.copy()
+		delta = step(*args)
+		# the last sweep stays plain, so the values returned are the ones
+		# delta was measured on
+		if delta >= self.eps:
+			self.V = self.accelerator.step(V, self.V)
+
+		return delta
+
+	def save_checkpoint(self, it):
+		if self.checkpoint is not None:
+			self.checkpoint.step(self, it)
 
 	def sync_eval_policy(self):
+		if self.compiled:
+			return self.compiled_eval_policy()
+
+		self.backups += self.num_states
 		delta = 0
-		for cur_state in self.states:
-			old_val = self.value_state[cur_state]
-			self.value_state[cur_state] = self.expected_returns(cur_state, self.policy[cur_state])
-			delta = np.maximum(delta, np.abs(old_val - self.value_state[cur_state]))
+		for i, cur_state in enumerate(self.states):
+			old_val = self.V[i]
+			self.V[i] = self.expected_returns(cur_state, self.policy_action(i))
+			delta = np.maximum(delta, np.abs(old_val - self.V[i]))
 
 		return delta
 
-	def sync_improve_policy(self):
+	def sync_improve_policy(self, keep_ties=False):
+		if self.compiled:
+			return self.compiled_improve_policy(keep_ties)
+
+		self.backups += self.num_states
 		stable = True
-		for cur_state in self.states:
-			old_action = self.policy[cur_state]
+		for i, cur_state in enumerate(self.states):
+			old_action = self.pi[i]
 			best_action = old_action
 			best_val = 0
-			for action in self.actions:
+			old_val = -np.inf
+			for a, action in enumerate(self.actions):
 				cur_val = self.expected_returns(cur_state, action)
+				if a == old_action:
+					old_val = cur_val
 				if cur_val > best_val:
 					best_val = cur_val
-					best_action = action
+					best_action = a
 
-			self.policy[cur_state] = best_action
-			
-			if self.verbose:
+			if keep_ties and old_val >= best_val - TIE_TOL * max(1, abs(best_val)):
+				best_action = old_action
+
+			if self.verbose and best_action != old_action:
 				print("* {0:^16} * {1:^17} * {2:^17} * {3:^17.4f} *".format(
-					str(cur_state), 
-					old_action, best_action, best_val))
+					str(cur_state), self.policy_action(i), self.actions[best_action], best_val))
+
+			self.pi[i] = best_action
 			
 			if best_action != old_action:
 				stable = False
 
 		return stable
 
-	def eval_policy(self, method="sync"):
-		assert(method in METHODS)
+	def exact_eval_policy(self):
+		if not self.compiled:
+			self.compile()
+
+		self.V = self.exact_policy_values(self.pi)
+
+	def exact_policy_values(self, pi):
+		rows = np.arange(self.num_states)
+		P_pi = self.policy_transitions(pi)
+		if sparse.issparse(P_pi):
+			A = sparse.identity(self.num_states, format="csc") - self.gamma * P_pi
+			return spsolve(A.tocsc(), self.R[rows, pi])
+
+		A = np.eye(self.num_states) - self.gamma * P_pi
+		return np.linalg.solve(A, self.R[rows, pi])
+
+	def eval_policy(self, method="sync", k=5):
+		assert(method in EVAL_METHODS)
+
+		start = perf_counter()
+		sweeps = 0
+		delta = 0
+		if self.accelerator is not None:
+			self.accelerator.reset()
 
 		if method == "sync":
 			delta = 10 * self.eps
 			while delta > self.eps:
-				delta = self.sync_eval_policy()
+				sweeps += 1
+				delta = self.timed("eval", sweeps, self.accelerated, self.sync_eval_policy)
 
 				if self.verbose:
 					print("Delta = {0}".format(delta))
 
+		if method == "exact":
+			self.timed("exact", 1, self.exact_eval_policy)
+
+		if method == "modified":
+			for sweeps in range(1, k+1):
+				delta = self.timed("eval", sweeps, self.accelerated, self.sync_eval_policy)
+
+				if self.verbose:
+					print("Delta = {0}".format(delta))
+
+		elapsed = perf_counter() - start
+		self.eval_stats.append((method, sweeps, elapsed))
+
+		if self.verbose:
+			print("Evaluated policy ({0}) in {1} sweeps, {2:.4f}s".format(method, sweeps, elapsed))
+
+		return delta
+
 	def value_iteration(self, delta):
+		if self.compiled:
+			return self.compiled_value_iteration(delta)
+
+		self.backups += self.num_states
 		it = 0
-		for state in self.states:
-			old_val = self.value_state[state]
-			best_val = old_val
-			best_action = self.policy[state]
+		for i, state in enumerate(self.states):
+			old_val = self.V[i]
+			best_val = old_val if self.monotone() else -np.inf
 			for action in self.actions:
 				cur_val = self.expected_returns(state, action)
 				# print(cur_val, state, action)
 				if cur_val > best_val:
-					best_action = action
 					best_val = cur_val
-			self.value_state[state] = best_val
+			self.V[i] = best_val
 			delta = max(delta, np.abs(old_val - best_val))
 			it += 1
 
-			if self.verbose and (it % (self.num_states // 10) == 0):
+			if self.verbose and (it % max(1, self.num_states // 10) == 0):
 				print("Delta = {0}".format(delta))
 
 		return delta
 
-	def improve_policy(self, method="sync"):
-		assert(method in METHODS)
+	def value_bounds(self):
+		raise NotImplementedError("{0} has no value bounds for gamma = 1".format(type(self).__name__))
+
+	def pair_transitions(self):
+		# one CSR row per (state, action) pair, in the order of R.ravel()
+		if self.sparse:
+			states, actions = np.divmod(np.arange(self.R.size), len(self.actions))
+			return self.P.pair_matrix(states, actions)
+
+		return sparse.csr_matrix(self.P.reshape(self.R.size, self.num_states))
+
+	def restrict_actions(self, keep):
+		# drop the (state, action) pairs where keep is False
+		states, actions = self.live
+		self.live = (states[keep], actions[keep])
+		self.live_starts = np.flatnonzero(np.r_[True, self.live[0][1:] != self.live[0][:-1]])
+		self.live_R = self.live_R[keep]
+		self.live_P = self.live_P[keep]
+
+	def live_values(self, V):
+		return self.live_R + self.gamma * (self.live_P @ V)
+
+	def start_elimination(self):
+		if not self.compiled:
+			self.compile(self.sparse)
+
+		num_actions = len(self.actions)
+		self.live = np.divmod(np.arange(self.num_states * num_actions), num_actions)
+		self.live_starts = np.arange(0, self.num_states * num_actions, num_actions)
+		self.live_R = self.R.ravel()
+		self.live_P = self.pair_transitions()
+		self.elimination_stats = []
+		self.value_error = np.inf
+		if self.gamma < 1:
+			self.slack = np.inf
+		else:
+			# no contraction to bound the error with, so iterate from both ends
+			lo, hi = self.value_bounds()
+			self.upper = np.full(self.num_states, float(hi))
+			if not self.warm:
+				self.V = np.full(self.num_states, float(lo))
+				return
+
+			# loaded values can only seed the lower sequence if they are a lower
+			# bound on V*, which holds when a backup does not lower them
+			V = np.clip(self.V, lo, hi)
+			excess = np.max(V - np.maximum.reduceat(self.live_values(V), self.live_starts))
+			if excess > self.eps:
+				raise ValueError("Loaded values exceed their backup by {0}, so they are not a lower "
+								 "bound for elimination with gamma = 1".format(excess))
+			self.V = V
+
+	def elimination_sweep(self):
+		# value iteration over a shrinking action set: an action is dropped for
+		# good once an upper bound on its value falls below a lower bound on the
+		# optimal value of its state; self.gap keeps the width of the bounds on V*
+		# and self.center their midpoint
+		states = self.live[0]
+		self.backups += self.num_states
+		Q = self.live_values(self.V)
+		TV = np.maximum.reduceat(Q, self.live_starts)
+
+		if self.gamma < 1:
+			# MacQueen bounds, with the zero caps keeping them valid for rows
+			# that lose mass (invalid actions, terminal states)
+			d = TV - self.V
+			c = self.gamma / (1 - self.gamma)
+			upper_q = Q + self.gamma * self.slack
+			lower = TV + c * min(d.min(), 0)
+			self.slack = c * max(d.max(), 0)
+			self.gap = self.slack - c * min(d.min(), 0)
+			self.center = TV + (self.slack + c * min(d.min(), 0)) / 2
+		else:
+			upper_q = self.live_values(self.upper)
+			self.upper = np.minimum(self.upper, np.maximum.reduceat(upper_q, self.live_starts))
+			lower = TV = np.maximum(self.V, TV)
+			self.gap = np.max(self.upper - lower)
+			self.center = (self.upper + lower) / 2
+
+		delta = np.max(np.abs(TV - self.V))
+		self.V = TV
+
+		# eps of slack keeps actions that only lose to rounding (exact ties)
+		keep = (upper_q + self.eps >= lower[states]) | (Q == TV[states])
+		if not keep.all():
+			self.restrict_actions(keep)
+
+		self.elimination_stats.append((self.val_it, len(self.live[0]), self.gap))
+		if self.verbose:
+			print("Delta = {0}, gap = {1}, {2} actions left".format(delta, self.gap, 
+																	 len(self.live[0])))
+
+		return delta
+
+	def live_improve_policy(self):
+		# greedy among the surviving actions, first one on ties
+		states, actions = self.live
+		self.backups += self.num_states
+		Q = self.live_values(self.V)
+		best_val = np.maximum.reduceat(Q, self.live_starts)
+		first = np.flatnonzero(Q == best_val[states])
+		_, idx = np.unique(states[first], return_index=True)
+
+		return self.greedy_update(best_val, actions[first[idx]])
+
+	def parallel_sweep(self, backend):
+		self.backups += self.num_states
+		self.V, delta = backend.sweep(self.V, self.backup_floor())
+
+		return delta
+
+	def parallel_value_iteration(self, workers):
+		with ShardedBackend(self, workers) as backend:
+			while True:
+				self.val_it += 1
+
+				if self.verbose:
+					print("Starting Iteration #{0} of value iteration".format(self.val_it))
+
+				delta = self.timed("value_iter", self.val_it, self.parallel_sweep, backend)
+				self.save_checkpoint(self.val_it)
+
+				if delta < self.eps:
+					break
+
+			if self.compiled:
+				self.timed("improve", 1, self.sync_improve_policy)
+			else:
+				self.backups += self.num_states
+				self.timed("improve", 1, self.greedy_update, *backend.greedy(self.V))
+
+	def improve_policy(self, method="sync", order=None, theta=0, evaluation="sync", k=5,
+					   workers=None, warm_start=None, checkpoint=None, checkpoint_every=1,
+					   resume=False, callback=None, accelerator=None):
+		assert(method in self.methods)
+
+		if callback is not None:
+			self.callbacks.append(callback)
+
+		self.accelerator = accelerator
+
+		if warm_start is not None:
+			self.warm_start(warm_start)
+
+		if checkpoint is not None:
+			self.checkpoint = Checkpoint(checkpoint, checkpoint_every)
+			if resume and self.checkpoint.exists():
+				self.checkpoint.load(self)
+				self.warm = True
+
+		self.solve(method, order, theta, evaluation, k, workers)
+
+		if self.checkpoint is not None:
+			self.checkpoint.save(self)
+			self.checkpoint.close()
+			self.checkpoint = None
+
+		if callback is not None:
+			self.callbacks.remove(callback)
+
+		self.accelerator = None
+		self.warm = False
+
+	def solve(self, method, order, theta, evaluation, k, workers):
+		if method == "value_iter" and workers is not None:
+			return self.parallel_value_iteration(workers)
 
 		if method == "sync":
 			stable = False
-			while not stable:
+			delta = 0
+			# partial evaluation can look stable before the values have settled
+			while not stable or delta > self.eps:
 				self.val_it += 1
 				
 				if self.verbose:
 					print("Starting Iteration #{0} of policy evaluation".format(self.val_it))
 
-				self.eval_policy(method)
+				delta = self.eval_policy(evaluation, k)
 				
 				if self.verbose:
 					print("="*80)
@@ -118,13 +601,17 @@ class MDP(ABC):
 																			 "Best Value"))
 					print("*"*80)
 
-				stable = self.sync_improve_policy()
+				stable = self.timed("improve", self.pol_it, self.sync_improve_policy, True)
+				self.save_checkpoint(self.pol_it)
 				
 				if self.verbose:
 					print("*"*80)
 					print("="*80)
 
-		if method == "value_iter":
+		if method in ["value_iter", "gauss_seidel"]:
+			if self.accelerator is not None:
+				self.accelerator.reset()
+
 			while True:
 				delta = 0
 				self.val_it += 1
@@ -132,11 +619,52 @@ class MDP(ABC):
 				if self.verbose:
 					print("Starting Iteration #{0} of value iteration".format(self.val_it))
 
-				delta = self.value_iteration(delta)
+				if method == "value_iter":
+					delta = self.timed("value_iter", self.val_it, self.accelerated, 
+									   self.value_iteration, delta)
+				else:
+					delta = self.timed("gauss_seidel", self.val_it, self.accelerated, 
+									   self.gauss_seidel_sweep, delta, order)
+				self.save_checkpoint(self.val_it)
 
 				if delta < self.eps:
 					break
 
+		if method == "prioritized":
+			self.prioritized_sweeping(theta)
+
+		if method == "eliminate":
+			self.start_elimination()
+			while True:
+				self.val_it += 1
+
+				if self.verbose:
+					print("Starting Iteration #{0} of value iteration".format(self.val_it))
+
+				delta = self.timed("eliminate", self.val_it, self.elimination_sweep)
+				self.save_checkpoint(self.val_it)
+
+				# one action left everywhere already proves the greedy policy
+				# optimal, and its exact values are V*
+				if len(self.live[0]) == self.num_states:
+					self.V = self.exact_policy_values(self.live[1])
+					self.value_error = 0.
+					break
+
+				# otherwise the iterate is only a lower bound: report the midpoint
+				# of the bounds, within gap / 2 of V*, unless the upper sequence
+				# (gamma = 1) is still too loose for that to help
+				if self.gap < self.eps or delta < self.eps:
+					if self.gamma < 1 or self.gap < self.eps:
+						self.V = self.center
+						self.value_error = self.gap / 2
+					else:
+						self.value_error = self.gap
+						if self.verbose:
+							print("V is a lower bound, up to {0} below V*".format(self.gap))
+					break
+
+		if method in ["value_iter", "gauss_seidel", "prioritized", "eliminate"]:
 			if self.verbose:
 				print("="*80)
 				print("Finding optimal policy")
@@ -147,7 +675,10 @@ class MDP(ABC):
 																		 "Best Value"))
 				print("*"*80)
 
-			self.sync_improve_policy()
+			if method == "eliminate":
+				self.timed("improve", 1, self.live_improve_policy)
+			else:
+				self.timed("improve", 1, self.sync_improve_policy)
 
 
 	@abstractmethod
@@ -0,0 +1,48 @@
+import os
+import numpy as np
+
+CHECKPOINT_DTYPE = np.dtype([("V", float), ("pi", np.int64)])
+
+class Checkpoint:
+	# values and policy of an MDP kept in a memory-mapped .npy file that is
+	# rewritten in place, so a dead kernel loses at most `every` iterations
+	def __init__(self, path, every=1):
+		self.path = path
+		self.every = every
+		self.store = None
+
+	def exists(self):
+		return os.path.exists(self.path)
+
+	def open(self, num_states, mode):
+		store = np.lib.format.open_memmap(self.path, mode=mode)
+		if store.dtype != CHECKPOINT_DTYPE or store.shape != (num_states,):
+			raise ValueError("{0} does not hold a checkpoint for {1} states".format(
+				self.path, num_states))
+
+		return store
+
+	def load(self, mdp):
+		store = self.open(mdp.num_states, "r")
+		mdp.V = np.array(store["V"])
+		mdp.pi = np.array(store["pi"])
+
+	def save(self, mdp):
+		if self.store is None:
+			if self.exists():
+				self.store = self.open(mdp.num_states, "r+")
+			else:
+				self.store = np.lib.format.open_memmap(self.path, mode="w+",
+													   dtype=CHECKPOINT_DTYPE,
+													   shape=(mdp.num_states,))
+
+		self.store["V"] = mdp.V
+		self.store["pi"] = mdp.pi
+		self.store.flush()
+
+	def step(self, mdp, it):
+		if it % self.every == 0:
+			self.save(mdp)
+
+	def close(self):
+		self.store = None
@@ -0,0 +1,75 @@
+from collections.abc import Mapping
+from itertools import product
+import numpy as np
+
+class StateIndexer:
+	# maps multi-dimensional states to flat indices by mixed-radix arithmetic
+	# (last dimension varies fastest, same order as itertools.product)
+	def __init__(self, states_dim):
+		self.dims = tuple(states_dim)
+		self.strides = tuple(int(np.prod(self.dims[k+1:])) for k in range(len(self.dims)))
+		self.size = int(np.prod(self.dims))
+
+	def __len__(self):
+		return self.size
+
+	def index(self, state):
+		i = 0
+		for x, dim, stride in zip(state, self.dims, self.strides):
+			if not 0 <= x < dim:
+				raise KeyError(state)
+			i += x * stride
+
+		return i
+
+	def state(self, i):
+		return tuple(int(x) for x in np.unravel_index(i, self.dims))
+
+	def ravel(self, states):
+		return np.ravel_multi_index(np.asarray(states).T, self.dims)
+
+	def unravel(self, indices):
+		return np.stack(np.unravel_index(indices, self.dims), axis=-1)
+
+	def states(self):
+		return list(product(*[range(dim) for dim in self.dims]))
+
+class ValueView(Mapping):
+	# dict-style access to mdp.V keyed by state tuples
+	def __init__(self, mdp):
+		self.mdp = mdp
+
+	def __getitem__(self, state):
+		return self.mdp.V[self.mdp.indexer.index(state)]
+
+	def __setitem__(self, state, value):
+		self.mdp.V[self.mdp.indexer.index(state)] = value
+
+	def __iter__(self):
+		return iter(self.mdp.states)
+
+	def __len__(self):
+		return self.mdp.num_states
+
+class PolicyView(Mapping):
+	# dict-style access to mdp.pi keyed by state tuples, returning actions;
+	# actions outside mdp.actions (e.g. the gambler's 0 stake at 0 capital)
+	# are stored as -1 and remembered here
+	def __init__(self, mdp):
+		self.mdp = mdp
+		self.extra = {}
+
+	def __getitem__(self, state):
+		return self.mdp.policy_action(self.mdp.indexer.index(state))
+
+	def __setitem__(self, state, action):
+		i = self.mdp.indexer.index(state)
+		self.mdp.pi[i] = self.mdp.action_index.get(action, -1)
+		if self.mdp.pi[i] < 0:
+			self.extra[i] = action
+
+	def __iter__(self):
+		return iter(self.mdp.states)
+
+	def __len__(self):
+		return self.mdp.num_states
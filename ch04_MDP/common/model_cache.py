@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from hashlib import sha1
+import os
+import numpy as np
+
+class ModelCache:
+	# dicts of arrays keyed by model parameters, kept in memory and, when a
+	# directory is given, as .npz files on disk; both ends evict the least
+	# recently used entries beyond max_entries or max_bytes
+	def __init__(self, directory=None, max_entries=16, max_bytes=2**28):
+		self.directory = None if directory is None else os.path.expanduser(directory)
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.memory = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		if self.directory is not None:
+			os.makedirs(self.directory, exist_ok=True)
+
+	def path(self, key):
+		return os.path.join(self.directory, sha1(repr(key).encode()).hexdigest() + ".npz")
+
+	def get(self, key):
+		key = repr(key)
+		if key in self.memory:
+			self.memory.move_to_end(key)
+			self.hits += 1
+			return self.memory[key]
+
+		if self.directory is not None and os.path.exists(self.path(key)):
+			with np.load(self.path(key)) as data:
+				model = {name: data[name] for name in data.files}
+			os.utime(self.path(key))
+			self.hits += 1
+			self.remember(key, model)
+			return model
+
+		self.misses += 1
+		return None
+
+	def put(self, key, model):
+		key = repr(key)
+		for array in model.values():
+			array.flags.writeable = False
+		self.remember(key, model)
+
+		if self.directory is not None:
+			path = self.path(key)
+			tmp = path + ".tmp.npz"
+			np.savez(tmp, **model)
+			os.replace(tmp, path)
+			self.evict()
+
+	def nbytes(self):
+		return sum(array.nbytes for model in self.memory.values() for array in model.values())
+
+	def remember(self, key, model):
+		# a model larger than max_bytes on its own is not kept in memory
+		self.memory[key] = model
+		self.memory.move_to_end(key)
+		while len(self.memory) > self.max_entries or self.nbytes() > self.max_bytes:
+			self.memory.popitem(last=False)
+
+	def evict(self):
+		files = [os.path.join(self.directory, f) for f in os.listdir(self.directory)
+				 if f.endswith(".npz") and not f.endswith(".tmp.npz")]
+		files.sort(key=os.path.getmtime)
+		total = sum(os.path.getsize(f) for f in files)
+		for i, f in enumerate(files):
+			if len(files) - i <= self.max_entries and total <= self.max_bytes:
+				break
+			total -= os.path.getsize(f)
+			os.remove(f)
+
+	def clear(self):
+		self.memory.clear()
+		if self.directory is not None:
+			for f in os.listdir(self.directory):
+				if f.endswith(".npz"):
+					os.remove(os.path.join(self.directory, f))
@@ -0,0 +1,63 @@
+from multiprocessing import Pool, cpu_count
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+_mdp = None
+_V = None
+_shm = None
+
+def _init_worker(mdp, name, num_states):
+	global _mdp, _V, _shm
+	_mdp = mdp
+	_shm = SharedMemory(name=name)
+	_V = np.ndarray((num_states,), dtype=float, buffer=_shm.buf)
+	_V.flags.writeable = False
+
+def _backup_shard(bounds):
+	lo, hi = bounds
+	Q = _mdp.shard_action_values(_V, lo, hi)
+	best = np.argmax(Q, axis=1)
+
+	return Q[np.arange(hi - lo), best], best
+
+class ShardedBackend:
+	# Jacobi backups split into contiguous shards of states; workers read the
+	# previous values from shared memory and the parent gathers the results
+	def __init__(self, mdp, workers=None, shards=None):
+		self.mdp = mdp
+		self.workers = cpu_count() if workers is None else workers
+		shards = self.workers if shards is None else shards
+		edges = np.linspace(0, mdp.num_states, shards + 1).astype(int)
+		self.shards = [(lo, hi) for lo, hi in zip(edges[:-1], edges[1:]) if hi > lo]
+
+	def __enter__(self):
+		num_states = self.mdp.num_states
+		self.shm = SharedMemory(create=True, size=num_states * np.dtype(float).itemsize)
+		self.V = np.ndarray((num_states,), dtype=float, buffer=self.shm.buf)
+		self.pool = Pool(self.workers, initializer=_init_worker,
+						 initargs=(self.mdp, self.shm.name, num_states))
+
+		return self
+
+	def __exit__(self, *exc):
+		self.pool.close()
+		self.pool.join()
+		del self.V
+		self.shm.close()
+		self.shm.unlink()
+
+	def greedy(self, V):
+		self.V[:] = V
+		results = self.pool.map(_backup_shard, self.shards)
+		best_val = np.concatenate([r[0] for r in results])
+		best = np.concatenate([r[1] for r in results])
+
+		return best_val, best
+
+	def sweep(self, V, floor):
+		best_val, _ = self.greedy(V)
+		new_V = np.maximum(floor, best_val)
+		# reduce per shard, in shard order, so delta does not depend on scheduling
+		delta = max(np.max(np.abs(new_V[lo:hi] - V[lo:hi])) for lo, hi in self.shards)
+
+		return new_V, delta
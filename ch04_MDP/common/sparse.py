@@ -0,0 +1,78 @@
+import numpy as np
+from scipy import sparse
+
+def truncate(matrix, threshold):
+	# drop transitions below threshold and fold their mass back into the
+	# surviving entries of the same row
+	matrix = sparse.csr_matrix(matrix)
+	if threshold <= 0:
+		return matrix
+
+	mass = np.asarray(matrix.sum(axis=1)).ravel()
+	matrix.data[matrix.data < threshold] = 0
+	matrix.eliminate_zeros()
+	kept = np.asarray(matrix.sum(axis=1)).ravel()
+	scale = np.divide(mass, kept, out=np.zeros_like(mass), where=kept > 0)
+
+	return sparse.csr_matrix(sparse.diags(scale) @ matrix)
+
+class SparseTransitions:
+	# one CSR row per (state, action) pair that has successors, sorted by
+	# (state, action); pairs without a row lead nowhere (terminal/invalid)
+	def __init__(self, matrix, states, actions, num_states, num_actions):
+		self.matrix = sparse.csr_matrix(matrix)
+		self.states = np.asarray(states)
+		self.actions = np.asarray(actions)
+		self.shape = (num_states, num_actions, num_states)
+		self.keys = self.states.astype(np.int64) * num_actions + self.actions
+
+	@classmethod
+	def from_entries(cls, states, actions, next_states, probs, num_states,
+					 num_actions, threshold=0.):
+		keys = np.asarray(states, dtype=np.int64) * num_actions + actions
+		pairs, rows = np.unique(keys, return_inverse=True)
+		matrix = sparse.csr_matrix((probs, (rows, next_states)),
+								   shape=(len(pairs), num_states))
+
+		return cls(truncate(matrix, threshold), pairs // num_actions,
+				   pairs % num_actions, num_states, num_actions)
+
+	@property
+	def nnz(self):
+		return self.matrix.nnz
+
+	@property
+	def nbytes(self):
+		return self.matrix.data.nbytes + self.matrix.indices.nbytes + \
+			   self.matrix.indptr.nbytes + self.keys.nbytes
+
+	def __matmul__(self, V):
+		out = np.zeros(self.shape[:2])
+		out[self.states, self.actions] = self.matrix @ V
+
+		return out
+
+	def shard_matmul(self, lo, hi, V):
+		num_actions = self.shape[1]
+		start, stop = np.searchsorted(self.keys, [lo * num_actions, hi * num_actions])
+		out = np.zeros((hi - lo, num_actions))
+		out[self.states[start:stop] - lo, self.actions[start:stop]] = self.matrix[start:stop] @ V
+
+		return out
+
+	def state_matmul(self, i, V):
+		return self.shard_matmul(i, i + 1, V)[0]
+
+	def pair_matrix(self, states, actions):
+		# one row per requested (state, action) pair, empty where the pair has no row
+		target = np.asarray(states, dtype=np.int64) * self.shape[1] + actions
+		idx = np.minimum(np.searchsorted(self.keys, target), len(self.keys) - 1)
+		found = (self.keys[idx] == target) & (np.asarray(actions) >= 0)
+		selector = sparse.csr_matrix((np.ones(np.count_nonzero(found)),
+									  (np.flatnonzero(found), idx[found])),
+									 shape=(len(target), len(self.keys)))
+
+		return selector @ self.matrix
+
+	def policy_matrix(self, pi):
+		return self.pair_matrix(np.arange(self.shape[0]), pi)
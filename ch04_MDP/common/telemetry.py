@@ -0,0 +1,50 @@
+from collections import namedtuple
+from time import perf_counter
+import numpy as np
+
+SweepRecord = namedtuple("SweepRecord", ["kind", "sweep", "seconds", "backups",
+										 "backups_per_sec", "max_residual",
+										 "mean_residual", "policy_changes"])
+
+RECORD_DTYPE = np.dtype([("kind", "U16"), ("sweep", np.int64), ("seconds", float),
+						 ("backups", np.int64), ("backups_per_sec", float),
+						 ("max_residual", float), ("mean_residual", float),
+						 ("policy_changes", np.int64)])
+
+class SweepTimer:
+	# snapshot taken before a sweep; finish() compares against it afterwards
+	def __init__(self, mdp):
+		self.start = perf_counter()
+		self.backups = mdp.backups
+		self.V = mdp.V.copy()
+		self.pi = mdp.pi.copy()
+
+	def finish(self, mdp, kind, sweep):
+		seconds = perf_counter() - self.start
+		backups = mdp.backups - self.backups
+		residual = np.abs(mdp.V - self.V)
+
+		return SweepRecord(kind, sweep, seconds, backups,
+						   backups / seconds if seconds > 0 else np.inf,
+						   np.max(residual), np.mean(residual),
+						   int(np.count_nonzero(mdp.pi != self.pi)))
+
+class SolverMetrics:
+	# callback for MDP.improve_policy that keeps one record per sweep
+	def __init__(self):
+		self.records = []
+
+	def __call__(self, record):
+		self.records.append(record)
+
+	def __len__(self):
+		return len(self.records)
+
+	def to_records(self):
+		return np.rec.array(np.array([tuple(r) for r in self.records], dtype=RECORD_DTYPE))
+
+	def to_csv(self, path):
+		with open(path, "w") as f:
+			f.write(",".join(SweepRecord._fields) + "\n")
+			for r in self.records:
+				f.write(",".join(str(x) for x in r) + "\n")
@@ -1,18 +1,183 @@
 import numpy as np
+from itertools import product
+from numpy.lib.stride_tricks import sliding_window_view
 from matplotlib import pyplot as plt
-from common import MDP
+from common import MDP, SparseTransitions
+from common.base import METHODS
+
+TIE_RULES = ["first", "last", "random"]
+SWEEP_DTYPE = np.dtype([("prob_heads", float), ("gamma", float), ("goal", np.int64),
+                        ("capital", np.int64), ("value", float), ("stake", np.int64),
+                        ("sweeps", np.int64)])
 
 class GamblersProblem(MDP):
+    methods = METHODS + ["vectorized"]
+
     def __init__(self, goal=100, prob_heads=.5, eps=1e-4, gamma=1.0,
-                 verbose=False):
+                 verbose=False, compiled=False, sparse=False, threshold=0.,
+                 tie="first", tie_tol=0., block_size=2**18):
+        assert(tie in TIE_RULES)
         self.goal = goal
         self.ph = prob_heads
         self.gamma = gamma
+        self.tie = tie
+        self.tie_tol = tie_tol
+        self.block_size = block_size
+        self.stake_blocks = None
         states_dim = [goal+1]
         actions = list(range(1, goal))
         super().__init__(states_dim, actions, eps, verbose)
-        self.value_state[(self.goal,)] = 1
+        self.V[self.goal] = 1
         self.policy[(0,)] = 0
+        if compiled or sparse:
+            self.compile(sparse, threshold)
+
+    def transition_model(self):
+        capital = np.arange(self.goal + 1)
+        stakes = np.asarray(self.actions)
+        valid = (capital[:, None] > 0) & (capital[:, None] < self.goal) & \
+                (stakes[None, :] <= np.minimum(capital, self.goal - capital)[:, None])
+        s, a = np.nonzero(valid)
+        R = np.zeros((self.num_states, len(self.actions)))
+        R[self.goal, :] = 1
+
+        if self.sparse:
+            probs = np.repeat([self.ph, 1 - self.ph], len(s))
+            P = SparseTransitions.from_entries(np.tile(s, 2), np.tile(a, 2),
+                                               np.concatenate([s + stakes[a], s - stakes[a]]),
+                                               probs, self.num_states, len(self.actions),
+                                               self.threshold)
+            return P, R
+
+        P = np.zeros((self.num_states, len(self.actions), self.num_states))
+        P[s, a, s + stakes[a]] = self.ph
+        P[s, a, s - stakes[a]] = 1 - self.ph
+
+        return P, R
+
+    def value_bounds(self):
+        # the only reward is 1 for reaching the goal
+        return 0., 1.
+
+    def stake_mask(self):
+        # blocks of capitals whose (capital, stake) grid fits in block_size;
+        # a stake is valid while it is at most min(capital, goal - capital)
+        max_stake = np.minimum(np.arange(self.goal + 1), self.goal - np.arange(self.goal + 1))
+        blocks = []
+        lo = 0
+        while lo <= self.goal:
+            hi = lo + 1
+            while hi <= self.goal and (hi - lo + 1) * max(max_stake[lo:hi+1].max(), 1) <= self.block_size:
+                hi += 1
+            stakes = np.arange(1, max_stake[lo:hi].max() + 1)
+            blocks.append((lo, hi, stakes, stakes[None, :] <= max_stake[lo:hi, None]))
+            lo = hi
+
+        return blocks
+
+    def stake_values(self, V, block, out=None, ph=None, gamma=None):
+        # V[..., c + s] and V[..., c - s] for the block are strided windows over
+        # V padded with zeros, so no index arrays are built; invalid stakes are
+        # left unmasked and must be dropped with the block's valid mask. V may
+        # stack several settings, with ph and gamma given per row
+        ph = self.ph if ph is None else ph
+        gamma = self.gamma if gamma is None else gamma
+        lo, hi, stakes, valid = block
+        m = len(stakes)
+        pad = [(0, 0)] * (V.ndim - 1) + [(m, m)]
+        win = np.pad(gamma * ph * V, pad)
+        loss = np.pad(gamma * (1 - ph) * V[..., ::-1], pad)
+        win = sliding_window_view(win, m, axis=-1)[..., m + lo + 1:m + hi + 1, :]
+        loss = sliding_window_view(loss, m, axis=-1)[..., m + self.goal - hi + 2:m + self.goal - lo + 2, :]
+
+        return np.add(win, loss[..., ::-1, :], out=out)
+
+    def stake_sweep(self):
+        if self.stake_blocks is None:
+            self.stake_blocks = self.stake_mask()
+
+        self.backups += self.num_states
+        new_V = self.V.copy()
+        buf = np.empty(self.block_size)
+        for block in self.stake_blocks:
+            lo, hi, stakes, valid = block
+            if len(stakes) > 0:
+                Q = self.stake_values(self.V, block, out=buf[:valid.size].reshape(valid.shape))
+                new_V[lo:hi] = Q.max(axis=1, where=valid, initial=0)
+        new_V[self.goal] = 1
+        new_V = np.maximum(self.backup_floor(), new_V)
+        delta = np.max(np.abs(new_V - self.V))
+        self.V = new_V
+
+        return delta
+
+    def greedy_stakes(self, tie=None, tol=None, all_ties=False):
+        # with the defaults this is the rule of sync_improve_policy: the
+        # smallest stake with the best value, if that value beats 0
+        tie = self.tie if tie is None else tie
+        tol = self.tie_tol if tol is None else tol
+        assert(tie in TIE_RULES)
+        if self.stake_blocks is None:
+            self.stake_blocks = self.stake_mask()
+
+        self.backups += self.num_states
+        new_pi = self.pi.copy()
+        ties = [np.zeros(0, dtype=int) for s in self.states]
+        for block in self.stake_blocks:
+            lo, hi, stakes, valid = block
+            if len(stakes) == 0:
+                continue
+
+            Q = np.where(valid, self.stake_values(self.V, block), 0)
+            best_val = Q.max(axis=1, keepdims=True)
+            tied = valid & (Q >= best_val - tol) & (best_val > 0)
+            rows = np.flatnonzero(tied.any(axis=1))
+            if tie == "first":
+                pick = np.argmax(tied[rows], axis=1)
+            elif tie == "last":
+                pick = tied.shape[1] - 1 - np.argmax(tied[rows, ::-1], axis=1)
+            else:
+                pick = np.array([np.random.choice(np.flatnonzero(tied[r])) for r in rows], dtype=int)
+            new_pi[lo + rows] = stakes[pick] - 1
+
+            if all_ties:
+                for r in rows:
+                    ties[lo + r] = stakes[tied[r]]
+
+        # every stake is worth 1 once the goal is reached
+        new_pi[self.goal] = 0
+        ties[self.goal] = np.asarray(self.actions)
+        changed = new_pi != self.pi
+        self.pi = new_pi
+
+        if all_ties:
+            return ties
+
+        return not changed.any()
+
+    def solve(self, method, order, theta, evaluation, k, workers):
+        if method != "vectorized":
+            return super().solve(method, order, theta, evaluation, k, workers)
+
+        if self.accelerator is not None:
+            self.accelerator.reset()
+
+        while True:
+            self.val_it += 1
+
+            if self.verbose:
+                print("Starting Iteration #{0} of value iteration".format(self.val_it))
+
+            delta = self.timed("value_iter", self.val_it, self.accelerated, self.stake_sweep)
+            self.save_checkpoint(self.val_it)
+
+            if self.verbose:
+                print("Delta = {0}".format(delta))
+
+            if delta < self.eps:
+                break
+
+        self.timed("improve", 1, self.greedy_stakes)
 
     def expected_returns(self, state, action):
         if state[0] == 0:
@@ -24,11 +189,8 @@ class GamblersProblem(MDP):
         if action > min(state[0], self.goal - state[0]):
             return 0
     
-        next_state_win = tuple([state[0] + action])
-        next_state_loss = tuple([state[0] - action])
-        
-        return self.ph * self.gamma * self.value_state[next_state_win] + \
-               (1 - self.ph) * self.gamma * self.value_state[next_state_loss]
+        return self.ph * self.gamma * self.V[state[0] + action] + \
+               (1 - self.ph) * self.gamma * self.V[state[0] - action]
 
     def plot_value_function(self):
         x = np.zeros(self.num_states)
@@ -69,3 +231,51 @@ class GamblersProblem(MDP):
         ax.set_ylabel("Policy", size=18)
         ax.set_ylim(0, self.goal)
         plt.show()
+
+def sweep_parameters(prob_heads, gammas=[1.0], goals=[100], eps=1e-9, tie="first",
+                     tie_tol=0., block_size=2**18):
+    # solves every (goal, gamma, prob_heads) setting with the vectorized value
+    # iteration, stacking the settings of each goal so one backup advances all
+    # of them; settings drop out of the stack once their delta is below eps
+    table = []
+    for goal in goals:
+        settings = list(product(gammas, prob_heads))
+        gamma = np.array([g for g, ph in settings])[:, None]
+        ph = np.array([ph for g, ph in settings])[:, None]
+        solver = GamblersProblem(goal=goal, eps=eps, tie=tie, tie_tol=tie_tol)
+        # blocks are cut so the whole active stack fits in block_size
+        blocks = {}
+
+        V = np.zeros((len(settings), goal + 1))
+        V[:, goal] = 1
+        sweeps = np.zeros(len(settings), dtype=np.int64)
+        active = np.ones(len(settings), dtype=bool)
+        while active.any():
+            idx = np.flatnonzero(active)
+            if len(idx) not in blocks:
+                solver.block_size = max(block_size // len(idx), 1)
+                blocks[len(idx)] = solver.stake_mask()
+            old_V = V[idx]
+            new_V = old_V.copy()
+            for block in blocks[len(idx)]:
+                lo, hi, stakes, valid = block
+                if len(stakes) > 0:
+                    Q = solver.stake_values(old_V, block, ph=ph[idx], gamma=gamma[idx])
+                    new_V[:, lo:hi] = np.maximum(old_V[:, lo:hi],
+                                                 Q.max(axis=2, where=valid, initial=0))
+            new_V[:, goal] = np.maximum(old_V[:, goal], 1)
+
+            delta = np.max(np.abs(new_V - old_V), axis=1)
+            V[idx] = new_V
+            sweeps[idx] += 1
+            active[idx] = delta >= eps
+
+        init_pi = solver.pi.copy()
+        for p, (g, h) in enumerate(settings):
+            solver.gamma, solver.ph = g, h
+            solver.V, solver.pi = V[p], init_pi.copy()
+            solver.greedy_stakes()
+            for c in range(goal + 1):
+                table.append((h, g, goal, c, V[p, c], solver.policy_action(c), sweeps[p]))
+
+    return np.array(table, dtype=SWEEP_DTYPE)
@@ -1,14 +1,31 @@
-from common import MDP
+from common import MDP, ModelCache, SparseTransitions, truncate
+from math import factorial
+import os
+from scipy.sparse import kron, csr_matrix, diags
 import numpy as np
 from mpl_toolkits.mplot3d import Axes3D
 from matplotlib import pyplot as plt
 
 POISSON_UB = 11
+# shared by every instance and kept on disk, so re-running an experiment
+# skips model construction; pass cache=ModelCache() to keep models in
+# memory only, or ModelCache(directory) to keep them elsewhere
+MODEL_CACHE = ModelCache(os.path.join("~", ".cache", "intro-RL", "jacks_car_rental"))
+
+def poisson_vector(lam, ub=POISSON_UB):
+	# P(X = n) for n < ub - 1, with the tail P(X >= ub - 1) folded into the
+	# last bucket so no probability mass is dropped
+	n = np.arange(ub)
+	prob = np.exp(-lam) * lam**n / np.array([factorial(i) for i in n], dtype=float)
+	prob[-1] = 1 - prob[:-1].sum()
+
+	return prob
 
 class JacksCarRental(MDP):
 	def __init__(self, max_cars=10, max_move=5, move_cost=2, 
 				 rental_reward=10, rental_rate=[3,4], return_rate=[3,2],
-				 gamma=0.9, eps=1e-4, verbose=False):
+				 gamma=0.9, eps=1e-4, verbose=False, compiled=False, 
+				 sparse=False, threshold=0., cache=None):
 		self.max_cars 		= max_cars
 		self.max_move 		= max_move
 		self.move_cost 		= move_cost
@@ -16,51 +33,173 @@ class JacksCarRental(MDP):
 		self.rental_rate	= rental_rate
 		self.return_rate	= return_rate
 		self.gamma			= gamma
-		self.poisson_cache	= {}
+		self.cache			= MODEL_CACHE if cache is None else cache
 
 		states_dim 			= [max_cars+1, max_cars+1]
 		actions 			= list(range(-max_move, max_move+1))
 		super().__init__(states_dim, actions, eps, verbose)
 
+		self.cars_b1, self.cars_b2, self.valid = self.move_model()
+		model = self.reward_model()
+		self.trans_b1, self.rentals_b1 = model["trans_b1"], model["rentals_b1"]
+		self.trans_b2, self.rentals_b2 = model["trans_b2"], model["rentals_b2"]
+		self.rewards = model["rewards"]
+		if compiled or sparse:
+			self.compile(sparse, threshold)
+
+	def model_key(self):
+		# the dynamics only: costs and rewards are cheap to recompute, and
+		# keying on them would store the same transitions again for each
+		return ("JacksCarRental", self.max_cars, self.max_move, tuple(self.rental_rate), 
+				tuple(self.return_rate), POISSON_UB)
+
+	def branch_model(self, rental_rate, return_rate):
+		# distribution of the cars a branch ends the day with, and its expected
+		# rentals, given the cars it starts with after the overnight move
+		n = self.max_cars + 1
+		k = np.arange(POISSON_UB)
+		rental_prob = poisson_vector(rental_rate)
+		return_prob = poisson_vector(return_rate)
+		prob = np.outer(rental_prob, return_prob).ravel()
+
+		trans = np.zeros((n, n))
+		rentals = np.zeros(n)
+		for cars in range(n):
+			rented_cars = np.minimum(cars, k)
+			next_cars = np.minimum(cars - rented_cars[:, None] + k[None, :], self.max_cars)
+			trans[cars] = np.bincount(next_cars.ravel(), weights=prob, minlength=n)
+			rentals[cars] = rental_prob @ rented_cars
+
+		return trans, rentals
+
+	def move_model(self):
+		cars = np.asarray(self.states)
+		actions = np.asarray(self.actions)
+		num_cars_b1 = cars[:, [0]] - actions[None, :]
+		num_cars_b2 = cars[:, [1]] + actions[None, :]
+		# moving more cars than the branch holds is not allowed
+		valid = (num_cars_b1 >= 0) & (num_cars_b2 >= 0)
+		num_cars_b1 = np.clip(num_cars_b1, 0, self.max_cars)
+		num_cars_b2 = np.clip(num_cars_b2, 0, self.max_cars)
+
+		return num_cars_b1, num_cars_b2, valid
+
+	def reward_model(self):
+		model = self.cache.get(self.model_key())
+		if model is None:
+			trans_b1, rentals_b1 = self.branch_model(self.rental_rate[0], self.return_rate[0])
+			trans_b2, rentals_b2 = self.branch_model(self.rental_rate[1], self.return_rate[1])
+			model = {"trans_b1": trans_b1, "rentals_b1": rentals_b1, 
+					 "trans_b2": trans_b2, "rentals_b2": rentals_b2}
+			self.cache.put(self.model_key(), model)
+
+		rewards = - self.move_cost * np.abs(np.asarray(self.actions, dtype=float))[None, :] + \
+				  self.rental_reward * (model["rentals_b1"][self.cars_b1] + model["rentals_b2"][self.cars_b2])
+		rewards[~self.valid] = 0
+
+		return dict(model, rewards=rewards)
+
+	def transition_model(self):
+		# the dense backend never builds the (S, A, S) tensor: every path that
+		# would read it goes through the two branch matrices instead
+		if not self.sparse:
+			return None, self.rewards
+
+		key = self.model_key() + (self.sparse, self.threshold)
+		model = self.cache.get(key)
+		if model is None:
+			model = self.build_transitions()
+			self.cache.put(key, model)
+
+		matrix = csr_matrix((model["data"], model["indices"], model["indptr"]),
+							shape=(len(model["states"]), self.num_states))
+		P = SparseTransitions(matrix, model["states"], model["actions"], 
+							  self.num_states, len(self.actions))
+		return P, self.rewards
+
+	def after_move(self, threshold=0.):
+		# P(next state | cars at each branch after the move), one CSR row per
+		# post-move cell
+		return kron(truncate(self.trans_b1, threshold), truncate(self.trans_b2, threshold), format="csr")
+
+	def build_transitions(self):
+		s, a = np.nonzero(self.valid)
+		n = self.max_cars + 1
+		matrix = self.after_move(self.threshold)[self.cars_b1[s, a] * n + self.cars_b2[s, a]]
+		return {"data": matrix.data, "indices": matrix.indices, "indptr": matrix.indptr,
+				"states": s, "actions": a}
+
+	def action_values(self, V):
+		n = self.max_cars + 1
+		W = self.trans_b1 @ V.reshape(n, n) @ self.trans_b2.T
+		return self.R + self.gamma * np.where(self.valid, W[self.cars_b1, self.cars_b2], 0)
+
+	def shard_action_values(self, V, lo, hi):
+		if not self.compiled:
+			return super().shard_action_values(V, lo, hi)
+
+		n = self.max_cars + 1
+		W = self.trans_b1 @ V.reshape(n, n) @ self.trans_b2.T
+		next_vals = np.where(self.valid[lo:hi], W[self.cars_b1[lo:hi], self.cars_b2[lo:hi]], 0)
+		return self.R[lo:hi] + self.gamma * next_vals
+
+	def policy_values(self, V, pi):
+		n = self.max_cars + 1
+		rows = np.arange(self.num_states)
+		W = self.trans_b1 @ V.reshape(n, n) @ self.trans_b2.T
+		next_vals = np.where(self.valid[rows, pi], 
+							 W[self.cars_b1[rows, pi], self.cars_b2[rows, pi]], 0)
+		return self.R[rows, pi] + self.gamma * next_vals
+
+	def state_action_values(self, i):
+		if not self.compiled or self.sparse:
+			return super().state_action_values(i)
+
+		self.backups += 1
+		n = self.max_cars + 1
+		next_vals = ((self.trans_b1[self.cars_b1[i]] @ self.V.reshape(n, n)) * self.trans_b2[self.cars_b2[i]]).sum(axis=1)
+		return self.R[i] + self.gamma * np.where(self.valid[i], next_vals, 0)
+
+	def policy_transitions(self, pi):
+		if self.sparse:
+			return super().policy_transitions(pi)
+
+		n = self.max_cars + 1
+		rows = np.arange(self.num_states)
+		matrix = self.after_move()[self.cars_b1[rows, pi] * n + self.cars_b2[rows, pi]]
+		return diags(self.valid[rows, pi].astype(float)) @ matrix
+
+	def transition_triples(self):
+		if self.sparse:
+			return super().transition_triples()
+
+		s, a = np.nonzero(self.valid)
+		n = self.max_cars + 1
+		matrix = self.after_move()[self.cars_b1[s, a] * n + self.cars_b2[s, a]].tocoo()
+		return s[matrix.row], matrix.col, matrix.data
+
+	def pair_transitions(self):
+		# cell of the post-move grid each pair lands in, n*n (a zero) for invalid pairs
+		n = self.max_cars + 1
+		return np.where(self.valid, self.cars_b1 * n + self.cars_b2, n * n).ravel()
+
+	def live_values(self, V):
+		n = self.max_cars + 1
+		W = self.trans_b1 @ V.reshape(n, n) @ self.trans_b2.T
+		return self.live_R + self.gamma * np.append(W.ravel(), 0)[self.live_P]
 
-	def poisson(self, n, lam):
-		key = (n, lam)
-		if key not in self.poisson_cache.keys():
-			self.poisson_cache[key] = np.exp(-lam) * lam**n / (np.math.factorial(n))
+	def expected_returns(self, state, action):
+		if action > state[0] or -action > state[1]:
+			return 0
 
-		return self.poisson_cache[key]
+		n = self.max_cars + 1
+		num_cars_b1 = min(state[0] - action, self.max_cars)
+		num_cars_b2 = min(state[1] + action, self.max_cars)
+		values = self.V.reshape(n, n)
 
-	def expected_returns(self, state, action):
-		returns = - self.move_cost * abs(action)
-		all_prob = 0
-		for rental_b1 in range(0, POISSON_UB):
-			for rental_b2 in range(0, POISSON_UB):
-				num_cars_b1 = min(state[0] - action, self.max_cars)
-				num_cars_b2 = min(state[1] + action, self.max_cars)
-
-				rented_cars_b1 = min(num_cars_b1, rental_b1)
-				rented_cars_b2 = min(num_cars_b2, rental_b2)
-				num_cars_b1 -= rented_cars_b1
-				num_cars_b2 -= rented_cars_b2
-
-				reward = (rented_cars_b1 + rented_cars_b2) * self.rental_reward
-				
-				# prob = self.poisson(rental_b1, self.rental_rate[0]) * \
-				# 	   self.poisson(rental_b2, self.rental_rate[1])  
-				
-
-				for return_b1 in range(0, POISSON_UB):
-					for return_b2 in range(0, POISSON_UB):
-						num_cars_b1 = min(num_cars_b1 + return_b1, self.max_cars)
-						num_cars_b2 = min(num_cars_b2 + return_b2, self.max_cars)
-						next_state = (num_cars_b1, num_cars_b2)
-						prob =  self.poisson(rental_b1, self.rental_rate[0]) * \
-							    self.poisson(rental_b2, self.rental_rate[1]) * \
-							    self.poisson(return_b1, self.return_rate[0]) * \
-					   			self.poisson(return_b2, self.return_rate[1])  
-						# print(reward)
-						returns += prob * (reward + self.gamma * self.value_state[next_state])
-						# print(returns)
+		returns = - self.move_cost * abs(action) + \
+				  self.rental_reward * (self.rentals_b1[num_cars_b1] + self.rentals_b2[num_cars_b2])
+		returns += self.gamma * (self.trans_b1[num_cars_b1] @ values @ self.trans_b2[num_cars_b2])
 
 		return returns
 
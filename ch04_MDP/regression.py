@@ -0,0 +1,111 @@
+import os
+from random import seed
+from tempfile import TemporaryDirectory
+import numpy as np
+from gamblers_problem import GamblersProblem
+from jacks_car_rental import JacksCarRental
+from common import Anderson, Relaxation
+
+class SweepBudget:
+	# improve_policy callback that stops a solver which fails to converge
+	def __init__(self, sweeps):
+		self.sweeps = sweeps
+		self.count = 0
+
+	def __call__(self, record):
+		self.count += 1
+		if self.count > self.sweeps:
+			raise RuntimeError("no convergence in {0} sweeps".format(self.sweeps))
+
+def reference(make):
+	mdp = make(compiled=True)
+	mdp.eps = 1e-12
+	mdp.improve_policy("value_iter")
+
+	return mdp.V
+
+def check(name, make, tol=1e-6, sweeps=1000, **kwargs):
+	seed(0)
+	mdp = make()
+	budget = SweepBudget(sweeps)
+	mdp.improve_policy(callback=budget, **kwargs)
+	error = np.max(np.abs(mdp.V - reference(make)))
+	assert error < tol, "{0}: off by {1}".format(name, error)
+	print("{0:<32} {1:>5} sweeps, off by {2:.2e}".format(name, budget.count, error))
+
+	return mdp
+
+def gambler(goal=100, prob_heads=0.4, eps=1e-9, **kwargs):
+	return lambda **extra: GamblersProblem(goal=goal, prob_heads=prob_heads, eps=eps, **dict(kwargs, **extra))
+
+def exact_policy_iteration():
+	# tied stakes used to make exact policy iteration swap actions forever
+	for goal in [50, 64, 100, 128, 200]:
+		check("exact PI, sparse, goal {0}".format(goal), gambler(goal, sparse=True), evaluation="exact")
+	check("exact PI, dense, goal 200", gambler(200, compiled=True), evaluation="exact")
+
+def warm_starts():
+	# a warm start above V* used to stop value iteration after one sweep
+	above = gambler(prob_heads=0.45, compiled=True)()
+	above.improve_policy("value_iter")
+	for method, kwargs in [("vectorized", {}), ("value_iter", dict(compiled=True)),
+						   ("gauss_seidel", dict(compiled=True)), ("prioritized", dict(sparse=True))]:
+		check("warm {0} from above".format(method), gambler(**kwargs), method=method, warm_start=above)
+
+	# elimination with gamma = 1 keeps a warm start that is a lower bound...
+	below = gambler(prob_heads=0.35, compiled=True)()
+	below.improve_policy("value_iter")
+	cold = check("eliminate, cold", gambler(compiled=True), method="eliminate")
+	warm = check("eliminate, warm from below", gambler(compiled=True), method="eliminate", warm_start=below)
+	assert warm.val_it < cold.val_it
+
+	# ...and rejects one that is not
+	try:
+		gambler(compiled=True)().improve_policy("eliminate", warm_start=above)
+		raise AssertionError("eliminate accepted a warm start above V*")
+	except ValueError:
+		pass
+
+	with TemporaryDirectory() as directory:
+		path = os.path.join(directory, "checkpoint.npy")
+		try:
+			gambler(compiled=True)().improve_policy("eliminate", checkpoint=path, callback=SweepBudget(cold.val_it // 2))
+		except RuntimeError:
+			pass
+		resumed = check("eliminate, resumed", gambler(compiled=True), method="eliminate", checkpoint=path, resume=True)
+		assert resumed.val_it < cold.val_it
+
+def elimination_stops():
+	# stopping on the bounds used to leave V at the lower iterate, 0.033
+	# from V* on Jack's problem with eps = 1e-6
+	for eps, tol in [(1e-2, 5e-2), (1e-6, 1e-9)]:
+		make = lambda **extra: JacksCarRental(eps=eps, **dict(dict(compiled=True), **extra))
+		mdp = check("eliminate Jack, eps {0}".format(eps), make, tol=tol, method="eliminate")
+		assert np.max(np.abs(mdp.V - reference(make))) <= mdp.value_error + 1e-9
+
+def accelerators():
+	# accelerators that overshoot used to multiply the sweeps of the
+	# undiscounted Gambler's problem and change its policy; plain sweeps
+	# converge fast at prob_heads 0.4, so they must be left alone there, and
+	# relaxation gains nothing at 0.55 while Anderson roughly thirds the sweeps
+	jack = lambda **extra: JacksCarRental(eps=1e-6, **dict(dict(compiled=True), **extra))
+	for name, make, method, cut in [("Gambler 0.4", gambler(compiled=True), "value_iter", {}),
+									("Gambler 0.4", gambler(), "vectorized", {}),
+									("Gambler 0.55", gambler(prob_heads=0.55), "vectorized", {Anderson: .5}),
+									("Jack", jack, "value_iter", {Relaxation: .9, Anderson: .5})]:
+		seed(0)
+		plain = make()
+		plain.improve_policy(method)
+		for accelerator in [Relaxation(), Relaxation(1.9), Anderson(), Anderson(10)]:
+			mdp = check("{0} {1}, {2}".format(name, method, type(accelerator).__name__),
+						make, tol=1e-4, sweeps=2 * plain.val_it, method=method, accelerator=accelerator)
+			limit = cut.get(type(accelerator), 1.1) * plain.val_it
+			assert mdp.val_it <= limit, "{0} sweeps against {1}".format(mdp.val_it, plain.val_it)
+			if name != "Jack":
+				assert (mdp.pi == plain.pi).all()
+
+if __name__ == "__main__":
+	exact_policy_iteration()
+	warm_starts()
+	elimination_stops()
+	accelerators()
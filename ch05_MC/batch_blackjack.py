@@ -0,0 +1,87 @@
+from blackjack import CARD_VALUES, HIT, STICK, STATE_SHAPE, NUM_STATES, STATES, StateView, as_table, hand_value
+import numpy as np
+
+def draw_cards(rng, n):
+	return CARD_VALUES[rng.integers(len(CARD_VALUES), size=n)]
+
+def simulate_batch(policy, n, rng=None, a0=None):
+	# n hands played in lockstep; states are flat state indices (-1 pads
+	# steps after a hand is over), rewards are the final reward of each hand
+	table = as_table(policy)
+	rng = np.random.default_rng() if rng is None else rng
+	pl_cards = draw_cards(rng, (2, n))
+	dl_cards = draw_cards(rng, (2, n))
+	pl_hard = pl_cards.sum(axis=0)
+	pl_ace = (pl_cards == 1).any(axis=0)
+	dl_hard = dl_cards.sum(axis=0)
+	dl_ace = (dl_cards == 1).any(axis=0)
+	dl_showing = dl_cards[0]
+
+	while True:
+		pl_sum, _ = hand_value(pl_hard, pl_ace)
+		low = np.flatnonzero(pl_sum < 12)
+		if len(low) == 0:
+			break
+		card = draw_cards(rng, len(low))
+		pl_hard[low] += card
+		pl_ace[low] |= card == 1
+
+	states = []
+	actions = []
+	playing = np.ones(n, dtype=bool)
+	while True:
+		pl_sum, usable_ace = hand_value(pl_hard, pl_ace)
+		playing &= pl_sum <= 21
+		if not playing.any():
+			break
+		s = np.where(playing, np.ravel_multi_index((usable_ace.astype(np.int64),
+													np.clip(pl_sum, 12, 21) - 12,
+													dl_showing - 1), STATE_SHAPE), -1)
+		a = table[np.maximum(s, 0)]
+		if a0 is not None and len(states) == 0:
+			a = np.asarray(a0)
+		a = np.where(pl_sum == 21, STICK, a)
+		states.append(s)
+		actions.append(np.where(playing, a, -1))
+
+		hit = np.flatnonzero(playing & (a == HIT))
+		card = draw_cards(rng, len(hit))
+		pl_hard[hit] += card
+		pl_ace[hit] |= card == 1
+		playing[:] = False
+		playing[hit] = True
+
+	pl_sum, _ = hand_value(pl_hard, pl_ace)
+	dealing = pl_sum <= 21
+	while True:
+		dl_sum, _ = hand_value(dl_hard, dl_ace)
+		hit = np.flatnonzero(dealing & (dl_sum < 17))
+		if len(hit) == 0:
+			break
+		card = draw_cards(rng, len(hit))
+		dl_hard[hit] += card
+		dl_ace[hit] |= card == 1
+
+	rewards = np.sign(pl_sum - dl_sum).astype(float)
+	rewards[dl_sum > 21] = 1
+	rewards[pl_sum > 21] = -1
+
+	return np.stack(states, axis=1), np.stack(actions, axis=1), rewards
+
+def batch_MC_eval(policy, epochs, batch_size=2**16, seed=None):
+	# a state never repeats within a hand, so first-visit and every-visit MC
+	# coincide and the averages reduce to bincounts
+	table = as_table(policy)
+	rng = np.random.default_rng(seed)
+	returns = np.zeros(NUM_STATES)
+	counts = np.zeros(NUM_STATES)
+	for lo in range(0, epochs, batch_size):
+		states, _, rewards = simulate_batch(table, min(batch_size, epochs - lo), rng)
+		visited = states >= 0
+		step_rewards = np.broadcast_to(rewards[:, None], states.shape)
+		returns += np.bincount(states[visited], weights=step_rewards[visited], minlength=NUM_STATES)
+		counts += np.bincount(states[visited], minlength=NUM_STATES)
+
+	value = np.divide(returns, counts, out=np.zeros(NUM_STATES), where=counts > 0)
+
+	return StateView(value), STATES
@@ -1,5 +1,7 @@
 from random import choice, seed
 from statistics import mean
+from collections.abc import Mapping
+from itertools import product
 from mpl_toolkits.mplot3d import Axes3D
 from matplotlib import pyplot as plt
 from matplotlib import cm
@@ -27,7 +29,18 @@ CARD_VALUE = {"Ace":1,
 		 	  "Queen":10, 
 		 	  "King":10}
 
+CARD_VALUES = np.array([CARD_VALUE[card] for card in CARDS])
+CARD_POINTS = CARD_VALUES.tolist()
+ACE = CARDS.index("Ace")
+
 ACTIONS = ["Hit", "Stick"]
+HIT = ACTIONS.index("Hit")
+STICK = ACTIONS.index("Stick")
+
+# states are flat indices over [usable_ace, pl_sum - 12, dl_showing - 1]
+STATE_SHAPE = (2, 10, 10)
+NUM_STATES = int(np.prod(STATE_SHAPE))
+STATES = list(product([False, True], range(12, 22), range(1, 11)))
 
 REWARD = {"Win":1,
 		  "Loss":-1,
@@ -37,38 +50,117 @@ VERBOSE = True
 
 seed(a=42)
 
+class CardSource:
+	# cards (indices into CARDS) and uniforms for behaviour actions, drawn
+	# from numpy Generators a buffer at a time and handed out one by one
+	# with next(source.cards) and next(source.uniforms); each stream has its
+	# own Generator, so the cards dealt do not depend on how many uniforms
+	# were used
+	def __init__(self, seed=None, buffer_size=2**16):
+		self.buffer_size = buffer_size
+		self.seed(seed)
+
+	def seed(self, seed=None):
+		card_rng, uniform_rng = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(2)]
+		self.cards = self.stream(lambda: card_rng.integers(len(CARDS), size=self.buffer_size))
+		self.uniforms = self.stream(lambda: uniform_rng.random(self.buffer_size))
+
+	def stream(self, fill):
+		while True:
+			yield from fill().tolist()
+
+	def draw(self):
+		return next(self.cards)
+
+	def uniform(self):
+		return next(self.uniforms)
+
+	def deal(self):
+		cards = self.cards
+		return [next(cards), next(cards)], [next(cards), next(cards)]
+
+CARD_SOURCE = CardSource(42)
+
+def state_index(usable_ace, pl_sum, dl_showing):
+	return (int(usable_ace) * 10 + pl_sum - 12) * 10 + dl_showing - 1
+
+class StateView(Mapping):
+	# dict-style access to a per-state table keyed by (usable_ace, pl_sum,
+	# dl_showing); with labels, entries are indices into labels (actions)
+	def __init__(self, table, labels=None):
+		self.table = table
+		self.labels = labels
+
+	def __getitem__(self, state):
+		value = self.table[state_index(*state)]
+		return value if self.labels is None else self.labels[value]
+
+	def __setitem__(self, state, value):
+		self.table[state_index(*state)] = value if self.labels is None else self.labels.index(value)
+
+	def __iter__(self):
+		return iter(STATES)
+
+	def __len__(self):
+		return NUM_STATES
+
+class ActionValueView(Mapping):
+	# dict-style access to a (state, action) table keyed by (state, "Hit")
+	def __init__(self, table):
+		self.table = table
+
+	def __getitem__(self, key):
+		state, action = key
+		return self.table[state_index(*state), ACTIONS.index(action)]
+
+	def __iter__(self):
+		return ((s, a) for s in STATES for a in ACTIONS)
+
+	def __len__(self):
+		return self.table.size
+
+def as_table(policy):
+	if type(policy) is np.ndarray:
+		return policy
+	if isinstance(policy, StateView):
+		return policy.table
+	if isinstance(policy, Mapping):
+		table = np.empty(NUM_STATES, dtype=np.int64)
+		for s, a in policy.items():
+			table[state_index(*s)] = ACTIONS.index(a)
+		return table
+
+	return np.asarray(policy)
+
+def hand_value(hard_sum, has_ace):
+	# works on scalars and on numpy arrays alike
+	usable_ace = has_ace & (hard_sum <= 11)
+	return hard_sum + 10 * usable_ace, usable_ace
+
 def eval_hand(hand):
-	hand_sum = 0;
-	aces = 0
-	usable_ace = False
+	# aces count 1, and one of them 11 when that does not bust the hand
+	hand_sum = 0
 	for card in hand:
-		if card == "Ace":
-			aces += 1
-			continue
-
 		hand_sum += CARD_VALUE[card]
-
-	for i in range(aces):
-		if hand_sum <= 10:
-			hand_sum += 11
-			usable_ace = True
-		else:
-			usable_ace = False
-			hand_sum += 1
-
+	usable_ace = hand_sum <= 11 and "Ace" in hand
+	if usable_ace:
+		hand_sum += 10
 
 	return hand_sum, usable_ace
 
-def draw_hands():
-	pl_hand = [choice(CARDS), choice(CARDS)]
-	dl_hand = [choice(CARDS), choice(CARDS)]
+def draw_hands(source=None):
+	source = CARD_SOURCE if source is None else source
+	pl_hand, dl_hand = source.deal()
 
-	return pl_hand, dl_hand
+	return [CARDS[card] for card in pl_hand], [CARDS[card] for card in dl_hand]
 
 def check_game(pl_hand, dl_hand):
 	pl_sum, _ = eval_hand(pl_hand)
 	dl_sum, _ = eval_hand(dl_hand)
 
+	return game_reward(pl_sum, dl_sum)
+
+def game_reward(pl_sum, dl_sum):
 	if pl_sum > 21:
 		return REWARD["Loss"]
 
@@ -86,89 +178,107 @@ def check_game(pl_hand, dl_hand):
 	return None
 
 def initialize(init_action_value=False):
-	value_state = {}
 	if init_action_value:
-		action_value = {}
-		policy = {}
-	counts = {}
-	states = []
-	for usable_ace in [True, False]:
-		for pl_hand in range(12, 22):
-			for dl_showing in range(1,11):
-				s = (usable_ace, pl_hand, dl_showing)
-				states.append(s)
-				value_state[s] = 0
-				if init_action_value:
-					policy[s] = choice(ACTIONS)
-					for a in ACTIONS:
-						action_value[(s, a)] = 0
-						counts[(s, a)] = 1
-				else:
-					counts[s] = 1
-
-	if init_action_value:
-		return action_value, policy, counts, states
-
-	return value_state, counts, states
-
-def play_ep(policy, a0):
-	pl, dl = draw_hands()
-	while True:
-		pl_sum, usable_ace = eval_hand(pl)
-		if pl_sum >= 12:
-			break
-		pl.append(choice(CARDS))
-		
+		action_value = np.zeros((NUM_STATES, len(ACTIONS)))
+		policy = np.array([choice((HIT, STICK)) for s in STATES])
+		counts = np.ones((NUM_STATES, len(ACTIONS)))
+		return action_value, policy, counts, STATES
+
+	return np.zeros(NUM_STATES), np.ones(NUM_STATES), STATES
+
+def start_hands(state, source):
+	# a player hand that reaches state and the dealer's showing card plus a
+	# fresh hole card; with an infinite deck nothing else about the hands
+	# matters for the rest of the episode
+	usable_ace, pl_sum, dl_showing = state
+	if usable_ace:
+		pl = [ACE, pl_sum - 12]
+	elif pl_sum <= 20:
+		pl = [CARDS.index("10"), pl_sum - 11]
+	else:
+		pl = [CARDS.index("10"), CARDS.index("10"), ACE]
+
+	return pl, [dl_showing - 1, next(source.cards)]
+
+def play_ep(policy, a0, source=None, start=None, verbose=None):
+	# start is an optional state to play from instead of a fresh deal;
+	# verbose overrides VERBOSE for this episode
+	verbose = VERBOSE if verbose is None else verbose
+	policy = as_table(policy)
+	source = CARD_SOURCE if source is None else source
+	cards = source.cards
+	if start is None:
+		pl, dl = source.deal()
+		pl_hard = CARD_POINTS[pl[0]] + CARD_POINTS[pl[1]]
+	else:
+		pl, dl = start_hands(start, source)
+		pl_hard = sum(CARD_POINTS[card] for card in pl)
+	pl_ace = ACE in pl
+	pl_sum, usable_ace = hand_value(pl_hard, pl_ace)
+	while pl_sum < 12:
+		card = next(cards)
+		pl.append(card)
+		pl_hard += CARD_POINTS[card]
+		pl_ace |= card == ACE
+		pl_sum, usable_ace = hand_value(pl_hard, pl_ace)
+
+	dl_showing = CARD_POINTS[dl[0]]
 	steps = []
 	actions = []
-	players_turn = True
 	first_play = True
-	while True:
-		if players_turn:
-			pl_sum, usable_ace = eval_hand(pl)
-			if pl_sum > 21:
-				break
-			s = (usable_ace, pl_sum, CARD_VALUE[dl[0]])
-			if pl_sum == 21:
-				steps.append(s)
-				actions.append("Stick")
-				players_turn = False
-				continue
-			steps.append(s)
-			if a0 is not None and first_play:
-				first_play = False
-				a = a0
-			else:
-				a = policy[s]
-			actions.append(a)
-			if a is "Hit":
-				pl.append(choice(CARDS))
-			elif a is "Stick":
-				players_turn = False
+	while pl_sum <= 21:
+		s = state_index(usable_ace, pl_sum, dl_showing)
+		steps.append(s)
+		if pl_sum == 21:
+			actions.append(STICK)
+			break
+		if a0 is not None and first_play:
+			first_play = False
+			a = a0
 		else:
-			dl_sum, _ = eval_hand(dl)
-			if dl_sum > 21:
-				break
-
-			if dl_sum < 17:
-				dl.append(choice(CARDS))
-			else:
-				break
+			a = policy.item(s)
+		actions.append(a)
+		if a == STICK:
+			break
+		card = next(cards)
+		pl.append(card)
+		pl_hard += CARD_POINTS[card]
+		pl_ace |= card == ACE
+		pl_sum, usable_ace = hand_value(pl_hard, pl_ace)
 
-	reward = check_game(pl, dl)
+	dl_sum = play_dealer(dl, pl_sum, cards)
+	reward = game_reward(pl_sum, dl_sum)
 
-	if VERBOSE:
-		print("Steps {0}".format(steps))
-		print("Actions {0}".format(actions))
-		print("Player Hand {0}".format(pl))
-		print("Dealer Hand {0}".format(dl))
-		print("Reward {0}".format(reward))
-		print()
+	if verbose:
+		print_ep(steps, actions, pl, dl, reward)
 
 	return steps, actions, reward
 
+def play_dealer(dl, pl_sum, cards):
+	# the dealer only draws when the player has not bust
+	dl_hard = CARD_POINTS[dl[0]] + CARD_POINTS[dl[1]]
+	dl_ace = ACE in dl
+	dl_sum, _ = hand_value(dl_hard, dl_ace)
+	while pl_sum <= 21 and dl_sum < 17:
+		card = next(cards)
+		dl.append(card)
+		dl_hard += CARD_POINTS[card]
+		dl_ace |= card == ACE
+		dl_sum, _ = hand_value(dl_hard, dl_ace)
+
+	return dl_sum
+
+def print_ep(steps, actions, pl, dl, reward):
+	print("Steps {0}".format([STATES[s] for s in steps]))
+	print("Actions {0}".format([ACTIONS[a] for a in actions]))
+	print("Player Hand {0}".format([CARDS[card] for card in pl]))
+	print("Dealer Hand {0}".format([CARDS[card] for card in dl]))
+	print("Reward {0}".format(reward))
+	print()
+
 def first_visit_MC_eval(policy, epochs):
 	value_state, counts, states = initialize()
+	policy = as_table(policy)
 
 	for ep in range(epochs):
 		if VERBOSE:
@@ -180,7 +290,51 @@ def first_visit_MC_eval(policy, epochs):
 				counts[s] += 1
 				value_state[s] += (1.0/counts[s]) * (r - value_state[s])
 
-	return value_state, states
+	return StateView(value_state), states
+
+class RunningStats:
+	# per-state Welford running mean and variance
+	def __init__(self, size):
+		self.counts = np.zeros(size, dtype=np.int64)
+		self.mean = np.zeros(size)
+		self.M2 = np.zeros(size)
+
+	def update(self, i, x):
+		self.counts[i] += 1
+		delta = x - self.mean[i]
+		self.mean[i] += delta / self.counts[i]
+		self.M2[i] += delta * (x - self.mean[i])
+
+	def half_width(self, z=1.96):
+		n = self.counts
+		var = np.divide(self.M2, n - 1, out=np.full(len(n), np.inf), where=n > 1)
+		return z * np.sqrt(np.divide(var, n, out=np.full(len(n), np.inf), where=n > 0))
+
+def adaptive_MC_eval(policy, half_width=0.05, budget=10**6, z=1.96, min_visits=30,
+					 check_every=1000, targeted=True):
+	# first-visit MC until every state's confidence half-width is below
+	# half_width (with at least min_visits visits) or budget episodes were
+	# played; targeted episodes start from the states still too wide, in turn,
+	# instead of from a fresh deal
+	stats = RunningStats(NUM_STATES)
+	policy = as_table(policy)
+	episodes = 0
+	while episodes < budget:
+		wide = np.flatnonzero((stats.half_width(z) > half_width) | (stats.counts < min_visits))
+		if len(wide) == 0:
+			break
+
+		for ep in range(min(check_every, budget - episodes)):
+			if VERBOSE:
+				print("Game #{0}".format(episodes + ep + 1))
+			start = STATES[wide[ep % len(wide)]] if targeted else None
+			steps, _, r = play_ep(policy, None, start=start)
+			for t, s in enumerate(steps):
+				if s not in steps[:t]:
+					stats.update(s, r)
+		episodes += min(check_every, budget - episodes)
+
+	return StateView(stats.mean), STATES, StateView(stats.counts)
 
 def exploring_starts_MC(epochs):
 	action_value, policy, counts, states = initialize(True)
@@ -188,79 +342,73 @@ def exploring_starts_MC(epochs):
 	for ep in range(epochs):
 		if VERBOSE:
 			print("Game #{0}".format(ep+1))
-		a0 = choice(ACTIONS)
+		a0 = choice((HIT, STICK))
 		steps, actions, r = play_ep(policy, a0)
 		av_pairs = list(zip(steps, actions))
 		for t, s in enumerate(steps):
-			if (s, actions[t]) not in av_pairs[:t]:
-				counts[(s, actions[t])] += 1
-				action_value[(s, actions[t])] += (1.0/counts[(s, actions[t])]) * (r - action_value[(s, actions[t])])
-				policy[s] = "Hit" if action_value[(s, "Hit")] >= action_value[(s, "Stick")] else "Stick" 
-
-	return action_value, policy
-
-def play_ep_stochastic_policy(policy):
-	pl, dl = draw_hands()
-	while True:
-		pl_sum, usable_ace = eval_hand(pl)
-		if pl_sum >= 12:
-			break
-		pl.append(choice(CARDS))
-		
+			a = actions[t]
+			if (s, a) not in av_pairs[:t]:
+				counts[s, a] += 1
+				action_value[s, a] += (1.0/counts[s, a]) * (r - action_value[s, a])
+				policy[s] = HIT if action_value[s, HIT] >= action_value[s, STICK] else STICK
+
+	return ActionValueView(action_value), StateView(policy, ACTIONS)
+
+def play_ep_stochastic_policy(policy, source=None, verbose=None):
+	verbose = VERBOSE if verbose is None else verbose
+	policy = np.asarray(policy)
+	source = CARD_SOURCE if source is None else source
+	pl, dl = source.deal()
+	cards = source.cards
+	uniforms = source.uniforms
+	pl_hard = CARD_POINTS[pl[0]] + CARD_POINTS[pl[1]]
+	pl_ace = ACE in pl
+	pl_sum, usable_ace = hand_value(pl_hard, pl_ace)
+	while pl_sum < 12:
+		card = next(cards)
+		pl.append(card)
+		pl_hard += CARD_POINTS[card]
+		pl_ace |= card == ACE
+		pl_sum, usable_ace = hand_value(pl_hard, pl_ace)
+
+	dl_showing = CARD_POINTS[dl[0]]
 	steps = []
 	actions = []
-	players_turn = True
-	while True:
-		if players_turn:
-			pl_sum, usable_ace = eval_hand(pl)
-			if pl_sum > 21:
-				break
-			s = (usable_ace, pl_sum, CARD_VALUE[dl[0]])
-			if pl_sum == 21:
-				steps.append(s)
-				actions.append("Stick")
-				players_turn = False
-				continue
-			steps.append(s)
+	while pl_sum <= 21:
+		s = state_index(usable_ace, pl_sum, dl_showing)
+		steps.append(s)
+		if pl_sum == 21:
+			actions.append(STICK)
+			break
+		if verbose:
 			print(policy[s])
-			a = np.random.choice(ACTIONS, p=policy[s])
-			actions.append(a)
-			if a == "Hit":
-				pl.append(choice(CARDS))
-			elif a == "Stick":
-				players_turn = False
-		else:
-			dl_sum, _ = eval_hand(dl)
-			if dl_sum > 21:
-				break
+		# a pre-drawn uniform against the cumulative action probabilities
+		u = next(uniforms)
+		a = 0
+		cumulative = policy.item(s, 0)
+		while u >= cumulative and a < len(ACTIONS) - 1:
+			a += 1
+			cumulative += policy.item(s, a)
+		actions.append(a)
+		if a == STICK:
+			break
+		card = next(cards)
+		pl.append(card)
+		pl_hard += CARD_POINTS[card]
+		pl_ace |= card == ACE
+		pl_sum, usable_ace = hand_value(pl_hard, pl_ace)
 
-			if dl_sum < 17:
-				dl.append(choice(CARDS))
-			else:
-				break
+	dl_sum = play_dealer(dl, pl_sum, cards)
+	reward = game_reward(pl_sum, dl_sum)
 
-	reward = check_game(pl, dl)
-
-	if VERBOSE:
-		print("Steps {0}".format(steps))
-		print("Actions {0}".format(actions))
-		print("Player Hand {0}".format(pl))
-		print("Dealer Hand {0}".format(dl))
-		print("Reward {0}".format(reward))
-		print()
+	if verbose:
+		print_ep(steps, actions, pl, dl, reward)
 
 	return steps, actions, reward
 
 def off_policy_MC(epochs, gamma):
-	behavior_policy = {}
-	counts = {}
-	for pl_sum in range(12, 22):
-		for dl_showing in range(1, 11):
-			for usable_ace in [False, True]:
-				s = (usable_ace, pl_sum, dl_showing)
-				behavior_policy[s] = [.75, .25]
-				for a in ACTIONS:
-					counts[(s, a)] = 0
+	behavior_policy = np.tile([.75, .25], (NUM_STATES, 1))
+	counts = np.zeros((NUM_STATES, len(ACTIONS)))
 
 	action_value, policy, _, _ = initialize(True)
 
@@ -269,28 +417,20 @@ def off_policy_MC(epochs, gamma):
 		G = 0
 		W = 1
 		for t, s in enumerate(steps):
+			a = actions[t]
 			G = gamma*G + reward
-			counts[(s, actions[t])] += W
-			action_value[(s, actions[t])] += (W / counts[(s, actions[t])]) * (G - action_value[(s, actions[t])])
-			policy[s] = "Hit" if action_value[(s, "Hit")] >= action_value[(s, "Stick")] else "Stick"
-			if policy[s] != actions[t]:
+			counts[s, a] += W
+			action_value[s, a] += (W / counts[s, a]) * (G - action_value[s, a])
+			policy[s] = HIT if action_value[s, HIT] >= action_value[s, STICK] else STICK
+			if policy[s] != a:
 				break
-			W *= 1 / behavior_policy[s][ACTIONS.index(actions[t])]
+			W *= 1 / behavior_policy[s, a]
 
-	return action_value, policy
+	return ActionValueView(action_value), StateView(policy, ACTIONS)
 
 def fixed_policy(threshold):
-	policy = {}
-	for usable_ace in [True, False]:
-		for pl_hand in range(12, 22):
-			for dl_showing in range(1,11):
-				s = (usable_ace, pl_hand, dl_showing)
-				if pl_hand >= threshold:
-					policy[s] = "Stick"
-				else:
-					policy[s] = "Hit"
-
-	return policy
+	pl_sum = np.array([s[1] for s in STATES])
+	return StateView(np.where(pl_sum >= threshold, STICK, HIT), ACTIONS)
 
 def plot_value_state(value_state, states, title):
 	x, y, z = [], [], []
@@ -381,6 +521,17 @@ def plot_policy(policy, title):
 if __name__ == "__main__":
 	assert(len(argv) >= 2)
 	epochs = int(argv[1])
+	# "exact" values learned policies by dynamic programming instead of
+	# another Monte Carlo pass
+	exact = "exact" in argv[2:]
+	if exact:
+		from exact_blackjack import policy_values
+
+	def evaluate(policy):
+		if exact:
+			return policy_values(policy)[0], STATES
+		return first_visit_MC_eval(policy, epochs)
+
 	policy = fixed_policy(20)
 	value_state, states = first_visit_MC_eval(policy, epochs)
 	if VERBOSE:
@@ -394,13 +545,13 @@ if __name__ == "__main__":
 	plot_value_state(value_state, states, "Figure 5.1")
 
 	action_value, policy = exploring_starts_MC(epochs)
-	value_state, states = first_visit_MC_eval(policy, epochs)
+	value_state, states = evaluate(policy)
 	plot_value_state(value_state, states, "Figure 5.2")
 	plot_policy(policy, "Figure 5.2")
 
 	gamma = 0.9
 	action_value, policy = off_policy_MC(epochs, gamma)
-	value_state, states = first_visit_MC_eval(policy, epochs)
+	value_state, states = evaluate(policy)
 	plot_value_state(value_state, states, "Off-Policy Blackjack")
 	plot_policy(policy, "Off-Policy Blackjack")
 
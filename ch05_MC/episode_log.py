@@ -0,0 +1,216 @@
+import os
+import numpy as np
+from blackjack import (ACTIONS, STICK, NUM_STATES, STATES, StateView, ActionValueView, as_table,
+					   play_ep, play_ep_stochastic_policy)
+
+# one raw binary file per column, appended to in place; offsets holds the
+# exclusive end step of every episode and is written last, once the other
+# columns are on disk, so it is the source of truth for how much of them
+# is complete
+COLUMNS = {"states": np.int16,
+		   "actions": np.int8,
+		   "rewards": np.float32}
+OFFSETS = ("offsets", np.int64)
+
+# the player always sticks on 21, whatever the behaviour policy says
+FORCED_STICK = np.array([pl_sum == 21 for _, pl_sum, _ in STATES])
+
+class EpisodeLog:
+	def __init__(self, directory, buffer_steps=2**16):
+		self.directory = os.path.expanduser(directory)
+		self.buffer_steps = buffer_steps
+		self.buffer = {name: [] for name in COLUMNS}
+		self.buffer_ends = []
+		os.makedirs(self.directory, exist_ok=True)
+		self.steps = self.recover()
+		self.buffered = 0
+
+	def path(self, name):
+		return os.path.join(self.directory, name + ".bin")
+
+	def recover(self):
+		# a crash can leave a partial offset, or offsets past column data
+		# that never reached the disk: keep the episodes that fit in every
+		# column and drop everything after them
+		self.truncate(*OFFSETS, self.length(*OFFSETS))
+		available = min(self.length(name, dtype) for name, dtype in COLUMNS.items())
+		offsets = self.column(*OFFSETS)
+		episodes = int(np.searchsorted(offsets, available, side="right"))
+		steps = int(offsets[episodes - 1]) if episodes else 0
+		del offsets
+		self.truncate(*OFFSETS, episodes)
+		for name, dtype in COLUMNS.items():
+			self.truncate(name, dtype, steps)
+
+		return steps
+
+	def length(self, name, dtype):
+		# whole items in a column file
+		path = self.path(name)
+		return os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0
+
+	def truncate(self, name, dtype, length):
+		with open(self.path(name), "ab") as f:
+			f.truncate(length * np.dtype(dtype).itemsize)
+
+	def column(self, name, dtype):
+		path = self.path(name)
+		if not os.path.exists(path) or os.path.getsize(path) < np.dtype(dtype).itemsize:
+			return np.zeros(0, dtype=dtype)
+		return np.memmap(path, dtype=dtype, mode="r")
+
+	def append(self, steps, actions, reward):
+		# blackjack only rewards the last step of an episode
+		rewards = np.zeros(len(steps))
+		if len(steps):
+			rewards[-1] = reward
+		self.extend(steps, actions, rewards, [len(steps)])
+
+	def extend(self, states, actions, rewards, lengths):
+		# several episodes at once, steps concatenated in episode order
+		self.buffer["states"].append(np.asarray(states, dtype=COLUMNS["states"]))
+		self.buffer["actions"].append(np.asarray(actions, dtype=COLUMNS["actions"]))
+		self.buffer["rewards"].append(np.asarray(rewards, dtype=COLUMNS["rewards"]))
+		ends = self.steps + self.buffered + np.cumsum(lengths)
+		self.buffer_ends.append(ends.astype(OFFSETS[1]))
+		self.buffered = int(ends[-1]) - self.steps if len(ends) else self.buffered
+		if self.buffered >= self.buffer_steps:
+			self.flush()
+
+	def extend_batch(self, states, actions, rewards):
+		# padded (n, T) arrays as returned by batch_blackjack.simulate_batch
+		states = np.asarray(states)
+		valid = states >= 0
+		lengths = valid.sum(axis=1)
+		step_rewards = np.zeros(states.shape)
+		step_rewards[np.arange(len(states)), np.maximum(lengths - 1, 0)] = np.where(lengths > 0, rewards, 0)
+		self.extend(states[valid], np.asarray(actions)[valid], step_rewards[valid], lengths)
+
+	def flush(self):
+		if not self.buffer_ends:
+			return
+		for name in COLUMNS:
+			with open(self.path(name), "ab") as f:
+				np.concatenate(self.buffer[name]).tofile(f)
+				f.flush()
+				os.fsync(f.fileno())
+			self.buffer[name] = []
+		with open(self.path(OFFSETS[0]), "ab") as f:
+			np.concatenate(self.buffer_ends).tofile(f)
+			f.flush()
+			os.fsync(f.fileno())
+		self.buffer_ends = []
+		self.steps += self.buffered
+		self.buffered = 0
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.flush()
+
+	def __len__(self):
+		return len(self.column(*OFFSETS))
+
+	def chunks(self, episodes=2**16):
+		# yields the steps of consecutive runs of whole episodes, with the
+		# chunk-local start and exclusive end of each step's episode
+		offsets = self.column(*OFFSETS)
+		columns = {name: self.column(name, dtype) for name, dtype in COLUMNS.items()}
+		for lo in range(0, len(offsets), episodes):
+			ends = np.asarray(offsets[lo:lo + episodes])
+			first = int(offsets[lo - 1]) if lo > 0 else 0
+			lengths = np.diff(ends, prepend=first)
+			step_ends = np.repeat(ends - first, lengths)
+			step_starts = step_ends - np.repeat(lengths, lengths)
+			yield (np.asarray(columns["states"][first:ends[-1]], dtype=np.int64),
+				   np.asarray(columns["actions"][first:ends[-1]], dtype=np.int64),
+				   np.asarray(columns["rewards"][first:ends[-1]], dtype=float),
+				   step_starts, step_ends)
+
+def record_episodes(log, policy, epochs, a0=None, verbose=False):
+	policy = as_table(policy)
+	for ep in range(epochs):
+		log.append(*play_ep(policy, a0, verbose=verbose))
+	log.flush()
+
+def record_stochastic_episodes(log, behavior_policy, epochs, verbose=False):
+	for ep in range(epochs):
+		log.append(*play_ep_stochastic_policy(behavior_policy, verbose=verbose))
+	log.flush()
+
+def episode_suffix(x, ends):
+	# sum of x (along its last axis) from each step to the end of its episode
+	tail = np.cumsum(x[..., ::-1], axis=-1)[..., ::-1]
+	tail = np.concatenate([tail, np.zeros(tail.shape[:-1] + (1,))], axis=-1)
+	return tail[..., :x.shape[-1]] - tail[..., ends]
+
+def returns(rewards, starts, ends, gamma=1.):
+	if gamma == 1:
+		return episode_suffix(rewards, ends)
+	t = np.arange(len(rewards)) - starts
+	return episode_suffix(rewards * gamma ** t, ends) / gamma ** t
+
+def first_visits(keys, starts):
+	# first occurrence of each key within its episode
+	order = np.lexsort((np.arange(len(keys)), keys, starts))
+	first = np.ones(len(keys), dtype=bool)
+	first[1:] = (keys[order][1:] != keys[order][:-1]) | (starts[order][1:] != starts[order][:-1])
+	mask = np.empty(len(keys), dtype=bool)
+	mask[order] = first
+
+	return mask
+
+def MC_eval(log, first_visit=True, gamma=1., chunk=2**16):
+	value_sums = np.zeros(NUM_STATES)
+	counts = np.zeros(NUM_STATES)
+	for states, _, rewards, starts, ends in log.chunks(chunk):
+		G = returns(rewards, starts, ends, gamma)
+		visit = first_visits(states, starts) if first_visit else np.ones(len(states), dtype=bool)
+		value_sums += np.bincount(states[visit], weights=G[visit], minlength=NUM_STATES)
+		counts += np.bincount(states[visit], minlength=NUM_STATES)
+
+	return StateView(np.divide(value_sums, counts, out=np.zeros(NUM_STATES), where=counts > 0)), STATES
+
+def first_visit_MC_eval(log, chunk=2**16):
+	return MC_eval(log, True, chunk=chunk)
+
+def every_visit_MC_eval(log, chunk=2**16):
+	return MC_eval(log, False, chunk=chunk)
+
+def follows_target(states, actions, ends, targets):
+	# (targets, steps) masks of whether each step, and every step after it
+	# in its episode, takes the action of each deterministic target
+	forced = FORCED_STICK[states]
+	off_target = (np.where(forced, STICK, targets[:, states]) != actions).astype(float)
+	later_off = episode_suffix(off_target, ends) - off_target
+
+	return off_target == 0, later_off == 0
+
+def behaviour_log_ratios(states, actions, ends, behavior_policy):
+	# log of 1 / b at each step and summed over the steps after it; the
+	# forced stick on 21 has probability one
+	log_ratio = -np.log(np.where(FORCED_STICK[states], 1., behavior_policy[states, actions]))
+
+	return log_ratio, episode_suffix(log_ratio, ends) - log_ratio
+
+def weighted_IS_eval(log, target, behavior_policy, gamma=1., chunk=2**16):
+	# off-policy estimate of a deterministic target's action values from a
+	# behaviour log: each pair is weighted by the importance ratio of the
+	# actions after it, and counts only if those all follow the target
+	target = as_table(target)
+	num_actions = len(ACTIONS)
+	value_sums = np.zeros(NUM_STATES * num_actions)
+	weights = np.zeros(NUM_STATES * num_actions)
+	for states, actions, rewards, starts, ends in log.chunks(chunk):
+		G = returns(rewards, starts, ends, gamma)
+		_, later_on_target = follows_target(states, actions, ends, target[None])
+		_, later_log_ratio = behaviour_log_ratios(states, actions, ends, behavior_policy)
+		W = np.where(later_on_target[0], np.exp(later_log_ratio), 0.)
+		pairs = states * num_actions + actions
+		value_sums += np.bincount(pairs, weights=W * G, minlength=len(weights))
+		weights += np.bincount(pairs, weights=W, minlength=len(weights))
+
+	action_value = np.divide(value_sums, weights, out=np.zeros(len(weights)), where=weights > 0)
+
+	return ActionValueView(action_value.reshape(NUM_STATES, num_actions))
@@ -0,0 +1,71 @@
+from functools import lru_cache
+from blackjack import (CARD_VALUES, HIT, STICK, STATE_SHAPE, NUM_STATES, STATES, StateView,
+					   ActionValueView, as_table)
+import numpy as np
+
+# infinite deck: card values 1..10, tens four times as likely
+CARD_PROBS = np.bincount(CARD_VALUES, minlength=11)[1:] / len(CARD_VALUES)
+DEALER_TOTALS = np.arange(17, 22)
+
+@lru_cache(maxsize=None)
+def dealer_final(hard_sum, has_ace):
+	# distribution of the dealer's final total over [17, ..., 21, bust]
+	total = hard_sum + 10 if has_ace and hard_sum <= 11 else hard_sum
+	outcome = np.zeros(len(DEALER_TOTALS) + 1)
+	if total > 21:
+		outcome[-1] = 1
+	elif total >= 17:
+		outcome[total - 17] = 1
+	else:
+		for card, p in enumerate(CARD_PROBS, 1):
+			outcome += p * dealer_final(hard_sum + card, has_ace or card == 1)
+
+	return outcome
+
+# rows are the dealer's showing card 1..10; the hole card is just the next draw
+DEALER_OUTCOMES = np.array([dealer_final(card, card == 1) for card in range(1, 11)])
+
+def stick_values():
+	# expected reward of sticking on 12..21 (rows) against each showing card
+	values = np.empty((10, 10))
+	for pl_sum in range(12, 22):
+		win = DEALER_OUTCOMES[:, -1] + DEALER_OUTCOMES[:, :-1] @ (DEALER_TOTALS < pl_sum)
+		loss = DEALER_OUTCOMES[:, :-1] @ (DEALER_TOTALS > pl_sum)
+		values[pl_sum - 12] = win - loss
+
+	return values
+
+STICK_VALUES = stick_values()
+
+def policy_values(policy):
+	# exact V and Q of a deterministic policy; hitting only ever raises the
+	# hard total, so hands without a usable ace are solved from 21 down, then
+	# those with one (which may fall back to a hand without)
+	table = as_table(policy).reshape(STATE_SHAPE)
+	V = np.zeros(STATE_SHAPE)
+	Q = np.zeros(STATE_SHAPE + (2,))
+	Q[..., STICK] = STICK_VALUES
+	for usable_ace in (0, 1):
+		for pl_sum in range(21, 11, -1):
+			hit = np.zeros(10)
+			for card, p in enumerate(CARD_PROBS, 1):
+				total = pl_sum + card
+				if total <= 21:
+					hit += p * V[usable_ace, total - 12]
+				elif usable_ace:
+					hit += p * V[0, total - 22]
+				else:
+					hit -= p
+			Q[usable_ace, pl_sum - 12, :, HIT] = hit
+			# the player always sticks on 21
+			a = STICK if pl_sum == 21 else table[usable_ace, pl_sum - 12]
+			V[usable_ace, pl_sum - 12] = np.where(a == HIT, hit, STICK_VALUES[pl_sum - 12])
+
+	return StateView(V.ravel()), ActionValueView(Q.reshape(NUM_STATES, 2))
+
+def rms_error(value_state, reference):
+	# root mean squared error of an estimate against exact state values
+	estimate = np.array([value_state[s] for s in STATES])
+	exact = np.array([reference[s] for s in STATES])
+
+	return np.sqrt(np.mean((estimate - exact) ** 2))
@@ -0,0 +1,76 @@
+import numpy as np
+from blackjack import (ACTIONS, STICK, NUM_STATES, StateView, ActionValueView, as_table,
+					   play_ep_stochastic_policy, fixed_policy)
+from episode_log import FORCED_STICK, returns, follows_target, behaviour_log_ratios
+
+class OffPolicyEvaluator:
+	# weighted importance sampling estimates for a batch of deterministic
+	# target policies from a single behaviour stream; every chunk of episodes
+	# is processed once for all targets
+	def __init__(self, targets, behavior_policy, gamma=1.):
+		self.targets = np.array([as_table(target) for target in targets])
+		self.behavior_policy = np.asarray(behavior_policy)
+		self.gamma = gamma
+		size = NUM_STATES * len(ACTIONS)
+		self.value_sums = np.zeros((len(self.targets), size))
+		self.weights = np.zeros((len(self.targets), size))
+		# whole-episode estimates, i.e. the expected reward of each target
+		self.score_sums = np.zeros(len(self.targets))
+		self.score_weights = np.zeros(len(self.targets))
+		self.episodes = 0
+
+	def update(self, states, actions, rewards, starts, ends):
+		# a chunk of whole episodes, as yielded by EpisodeLog.chunks
+		G = returns(rewards, starts, ends, self.gamma)
+		on_target, later_on_target = follows_target(states, actions, ends, self.targets)
+		log_ratio, later_log_ratio = behaviour_log_ratios(states, actions, ends, self.behavior_policy)
+		W = np.where(later_on_target, np.exp(later_log_ratio), 0.)
+
+		size = self.value_sums.shape[1]
+		pairs = (np.arange(len(self.targets))[:, None] * size + states * len(ACTIONS) + actions).ravel()
+		self.value_sums += np.bincount(pairs, weights=(W * G).ravel(), minlength=self.value_sums.size).reshape(self.value_sums.shape)
+		self.weights += np.bincount(pairs, weights=W.ravel(), minlength=self.weights.size).reshape(self.weights.shape)
+
+		first = np.flatnonzero(np.arange(len(states)) == starts)
+		W0 = np.where(on_target[:, first], W[:, first] * np.exp(log_ratio[first]), 0.)
+		self.score_sums += W0 @ G[first]
+		self.score_weights += W0.sum(axis=1)
+		self.episodes += len(first)
+
+	def add_episodes(self, episodes):
+		# episodes as (steps, actions, reward) from play_ep_stochastic_policy
+		lengths = np.array([len(steps) for steps, _, _ in episodes])
+		ends = np.repeat(np.cumsum(lengths), lengths)
+		starts = ends - np.repeat(lengths, lengths)
+		rewards = np.zeros(lengths.sum())
+		rewards[np.cumsum(lengths)[lengths > 0] - 1] = [r for steps, _, r in episodes if len(steps)]
+		self.update(np.concatenate([steps for steps, _, _ in episodes]).astype(np.int64),
+					np.concatenate([actions for _, actions, _ in episodes]).astype(np.int64),
+					rewards, starts, ends)
+
+	def run(self, epochs, chunk=2**12, verbose=False):
+		for lo in range(0, epochs, chunk):
+			self.add_episodes([play_ep_stochastic_policy(self.behavior_policy, verbose=verbose)
+							   for ep in range(min(chunk, epochs - lo))])
+
+	def replay(self, log, chunk=2**16):
+		for steps in log.chunks(chunk):
+			self.update(*steps)
+
+	def action_values(self):
+		action_value = np.divide(self.value_sums, self.weights, out=np.zeros(self.weights.shape), where=self.weights > 0)
+		return action_value.reshape(len(self.targets), NUM_STATES, len(ACTIONS))
+
+	def action_value(self, i):
+		return ActionValueView(self.action_values()[i])
+
+	def state_value(self, i):
+		# the target's own action in each state, bar the forced stick on 21
+		actions = np.where(FORCED_STICK, STICK, self.targets[i])
+		return StateView(self.action_values()[i, np.arange(NUM_STATES), actions])
+
+	def scores(self):
+		return np.divide(self.score_sums, self.score_weights, out=np.zeros(len(self.targets)), where=self.score_weights > 0)
+
+def threshold_policies(low=12, high=21):
+	return [fixed_policy(threshold) for threshold in range(low, high + 1)]
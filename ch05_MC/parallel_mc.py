@@ -0,0 +1,142 @@
+from multiprocessing import Pool, cpu_count
+from random import choice, seed as seed_random
+import numpy as np
+import blackjack
+from blackjack import (ACTIONS, HIT, STICK, NUM_STATES, STATES, StateView, ActionValueView,
+					   as_table, initialize, play_ep, play_ep_stochastic_policy)
+
+class MCStats:
+	# sufficient statistics of a Monte Carlo run: weighted return sums and the
+	# weights themselves (visit counts on-policy, cumulative importance
+	# weights off-policy), per state or state-action; runs merge by adding
+	def __init__(self, shape):
+		self.returns = np.zeros(shape)
+		self.weights = np.zeros(shape)
+		self.episodes = 0
+
+	def __iadd__(self, other):
+		self.returns += other.returns
+		self.weights += other.weights
+		self.episodes += other.episodes
+
+		return self
+
+	def estimate(self, prior=0.):
+		# prior acts as that many zero returns already seen, as in the serial
+		# estimators, whose counts start at 1
+		total = self.weights + prior
+		return np.divide(self.returns, total, out=np.zeros_like(self.returns), where=total > 0)
+
+def _init_worker():
+	blackjack.VERBOSE = False
+
+def _reseed(seed):
+	seed_random(int(seed))
+	blackjack.CARD_SOURCE.seed(int(seed))
+
+def _eval_episodes(args):
+	policy, episodes, seed = args
+	_reseed(seed)
+	stats = MCStats(NUM_STATES)
+	for ep in range(episodes):
+		steps, _, r = play_ep(policy, None)
+		for t, s in enumerate(steps):
+			if s not in steps[:t]:
+				stats.returns[s] += r
+				stats.weights[s] += 1
+	stats.episodes = episodes
+
+	return stats
+
+def _exploring_episodes(args):
+	policy, episodes, seed = args
+	_reseed(seed)
+	stats = MCStats((NUM_STATES, len(ACTIONS)))
+	for ep in range(episodes):
+		steps, actions, r = play_ep(policy, choice((HIT, STICK)))
+		av_pairs = list(zip(steps, actions))
+		for t, s in enumerate(steps):
+			a = actions[t]
+			if (s, a) not in av_pairs[:t]:
+				stats.returns[s, a] += r
+				stats.weights[s, a] += 1
+	stats.episodes = episodes
+
+	return stats
+
+def _off_policy_episodes(args):
+	(target, behavior_policy, gamma), episodes, seed = args
+	_reseed(seed)
+	stats = MCStats((NUM_STATES, len(ACTIONS)))
+	for ep in range(episodes):
+		steps, actions, reward = play_ep_stochastic_policy(behavior_policy)
+		G = 0
+		W = 1
+		for t, s in enumerate(steps):
+			a = actions[t]
+			G = gamma*G + reward
+			stats.returns[s, a] += W * G
+			stats.weights[s, a] += W
+			if target[s] != a:
+				break
+			W *= 1 / behavior_policy[s, a]
+	stats.episodes = episodes
+
+	return stats
+
+class ParallelMC:
+	# worker processes play their share of the episodes of each round with
+	# their own seeded streams and send back MCStats, which the parent merges
+	def __init__(self, workers=None, seed=None):
+		self.workers = cpu_count() if workers is None else workers
+		self.seeds = np.random.SeedSequence(seed)
+
+	def __enter__(self):
+		self.pool = Pool(self.workers, initializer=_init_worker)
+		return self
+
+	def __exit__(self, *exc):
+		self.pool.close()
+		self.pool.join()
+
+	def run(self, play, payload, episodes, stats):
+		shares = np.diff(np.linspace(0, episodes, self.workers + 1).astype(int))
+		seeds = [child.generate_state(1)[0] for child in self.seeds.spawn(self.workers)]
+		for result in self.pool.map(play, [(payload, n, s) for n, s in zip(shares, seeds) if n > 0]):
+			stats += result
+
+		return stats
+
+def rounds_of(epochs, rounds):
+	return np.diff(np.linspace(0, epochs, rounds + 1).astype(int))
+
+def greedy(action_value):
+	return np.where(action_value[:, HIT] >= action_value[:, STICK], HIT, STICK)
+
+def parallel_MC_eval(policy, epochs, workers=None, seed=None):
+	with ParallelMC(workers, seed) as runner:
+		stats = runner.run(_eval_episodes, as_table(policy), epochs, MCStats(NUM_STATES))
+
+	return StateView(stats.estimate(prior=1.)), STATES
+
+def parallel_exploring_starts_MC(epochs, rounds=100, workers=None, seed=None):
+	# the policy is improved between rounds, not after every episode
+	_, policy, _, _ = initialize(True)
+	stats = MCStats((NUM_STATES, len(ACTIONS)))
+	with ParallelMC(workers, seed) as runner:
+		for episodes in rounds_of(epochs, rounds):
+			runner.run(_exploring_episodes, policy, episodes, stats)
+			policy = greedy(stats.estimate(prior=1.))
+
+	return ActionValueView(stats.estimate(prior=1.)), StateView(policy, ACTIONS)
+
+def parallel_off_policy_MC(epochs, gamma, rounds=100, workers=None, seed=None):
+	behavior_policy = np.tile([.75, .25], (NUM_STATES, 1))
+	_, policy, _, _ = initialize(True)
+	stats = MCStats((NUM_STATES, len(ACTIONS)))
+	with ParallelMC(workers, seed) as runner:
+		for episodes in rounds_of(epochs, rounds):
+			runner.run(_off_policy_episodes, (policy, behavior_policy, gamma), episodes, stats)
+			policy = greedy(stats.estimate())
+
+	return ActionValueView(stats.estimate()), StateView(policy, ACTIONS)
@@ -2,7 +2,8 @@ import numpy as np
 from matplotlib import pyplot as plt
 from matplotlib import cm
 from sys import argv
-from gridworld import ACTIONS, ACTIONS_MAP, sarsa, eps_greedy, opt_policy
+from gridworld import ACTIONS, ACTIONS_MAP, sarsa, eps_greedy, opt_policy, action_values
+from tabular import TabularEnv, QTable
 from itertools import product
 from copy import deepcopy
 
@@ -23,7 +24,7 @@ def q_learn(action_value, policy, env, actions, step_size, discount, epochs):
 		while s != TERMINAL_STATE:
 			a = policy(s, action_value)
 			next_s, r = env(s, a)
-			max_Q = np.max([action_value[(next_s, a)] for a in actions])
+			max_Q = np.max(action_values(action_value, next_s, actions))
 			action_value[(s, a)] += step_size * (r + discount * max_Q - action_value[(s, a)])
 			s = next_s
 			steps.append(ep)
@@ -42,7 +43,7 @@ def expected_sarsa(action_value, policy, env, actions, eps, step_size, discount,
 		while s != TERMINAL_STATE:
 			a = policy(s, action_value)
 			next_s, r = env(s, a)
-			Q = np.asarray([action_value[(next_s, a)] for a in actions])
+			Q = action_values(action_value, next_s, actions)
 			prob = np.asarray([eps for a in actions])
 			prob[np.argmax(Q)] = 1 - eps
 			avg_Q = np.sum(Q * prob)
@@ -66,14 +67,17 @@ def cliff_gridworld(state, action):
 	
 	return next_state, reward
 
+def cliff_table(actions=ACTIONS):
+	return TabularEnv(STATES, actions, lambda s, a, o: cliff_gridworld(s, a), INITIAL_STATE, TERMINAL_STATE)
+
 def vanishing_eps_greedy(state, action_value, actions, eps):
 	global VAN_EPS_STEPS_COUNT
 	if np.random.random() < (eps / (0.1 * VAN_EPS_STEPS_COUNT + 1)):
 		return np.random.choice(actions)
 
 	VAN_EPS_STEPS_COUNT += 1
-	avs = [action_value[(state, a)] for a in actions]
-	avs_idx = [i for i, a in enumerate(avs) if a == np.max(avs)]
+	avs = action_values(action_value, state, actions)
+	avs_idx = np.flatnonzero(avs == np.max(avs))
 	return actions[np.random.choice(avs_idx)]
 
 def plot_policy(policy, action_value, title=""):
@@ -103,15 +107,11 @@ if __name__ == "__main__":
 	step_size = 0.5
 	epochs = 500
 	discount = 1
-	env = lambda s, a: cliff_gridworld(s, a)
+	env = cliff_table()
 	eps_pol = lambda s, avs: eps_greedy(s, avs, ACTIONS, eps)
 	opt_pol = lambda s, avs: opt_policy(s, avs, ACTIONS)
 	van_eps_pol = lambda s, avs: vanishing_eps_greedy(s, avs, ACTIONS, eps)
-	action_value = {}
-	for row in range(DIMENSIONS[0]):
-		for col in range(DIMENSIONS[1]):
-			for a in ACTIONS:
-				action_value[((row, col), a)] = 0
+	action_value = QTable(STATES, ACTIONS)
 
 	sarsa_avs = deepcopy(action_value)
 	q_learn_avs = deepcopy(action_value)
@@ -4,6 +4,7 @@ from matplotlib import pyplot as plt
 from matplotlib import cm
 from sys import argv
 from itertools import product
+from tabular import TabularEnv, QTable
 
 ACTIONS = ["up", "down", "left", "right"]
 ACTIONS_MAP = {"up"   		: (0,  1), 
@@ -17,6 +18,7 @@ ACTIONS_MAP = {"up"   		: (0,  1),
 KING_ACTIONS = ACTIONS + ["up-left", "up-right", "down-left", "down-right"]
 DIMENSIONS = (10, 7)
 WIND_STRENGTH = np.array([0, 0, 0, 1, 1, 1, 2, 2, 1, 0])
+WIND_NOISE = [-1, 0, 1]
 STATES = list(product(range(DIMENSIONS[0]), range(DIMENSIONS[1])))
 INITIAL_STATE = (0, 3)
 TERMINAL_STATE = (7, 3)
@@ -40,16 +42,21 @@ def sarsa(action_value, policy, env, step_size, discount, epochs):
 
 	return action_value, steps, rewards
 
+def action_values(action_value, state, actions):
+	if isinstance(action_value, QTable):
+		return action_value.row(state, actions)
+	return np.asarray([action_value[(state, a)] for a in actions])
+
 def opt_policy(state, action_value, actions):
-	avs = [action_value[(state, a)] for a in actions]
+	avs = action_values(action_value, state, actions)
 	return actions[np.argmax(avs)]
 
 def eps_greedy(state, action_value, actions, eps):
 	if np.random.random() < eps:
 		return np.random.choice(actions)
 
-	avs = [action_value[(state, a)] for a in actions]
-	avs_idx = [i for i, a in enumerate(avs) if a == np.max(avs)]
+	avs = action_values(action_value, state, actions)
+	avs_idx = np.flatnonzero(avs == np.max(avs))
 	return actions[np.random.choice(avs_idx)]
 
 def windy_gridworld(state, action):
@@ -62,9 +69,10 @@ def windy_gridworld(state, action):
 
 	return next_state, reward
 
-def stochastic_windy_gridworld(state, action):
+def stochastic_windy_gridworld(state, action, noise=None):
 	a_val = ACTIONS_MAP[action]
-	noise = np.random.choice([-1, 0, 1])
+	if noise is None:
+		noise = np.random.choice(WIND_NOISE)
 	next_state = (max(min(state[0]+a_val[0], DIMENSIONS[0]-1), 0), 
 				  max(min(state[1]+a_val[1], DIMENSIONS[1]-1), 0))
 	next_state = (next_state[0],
@@ -73,6 +81,12 @@ def stochastic_windy_gridworld(state, action):
 
 	return next_state, reward
 
+def windy_table(actions=ACTIONS, stochastic=False):
+	# the stochastic wind is a table of equally likely noise outcomes
+	if stochastic:
+		return TabularEnv(STATES, actions, stochastic_windy_gridworld, INITIAL_STATE, TERMINAL_STATE, WIND_NOISE)
+	return TabularEnv(STATES, actions, lambda s, a, o: windy_gridworld(s, a), INITIAL_STATE, TERMINAL_STATE)
+
 def plot_policy(policy, action_value, title=""):
 	moves = {}
 
@@ -100,14 +114,10 @@ if __name__ == "__main__":
 	step_size = 0.5
 	epochs = 200
 	discount = 1
-	env = lambda s, a: windy_gridworld(s, a)
+	env = windy_table(ACTIONS)
 	policy = lambda s, avs: eps_greedy(s, avs, ACTIONS, eps)
 	# regular windy gridworld
-	action_value = {}
-	for row in range(DIMENSIONS[0]):
-		for col in range(DIMENSIONS[1]):
-			for a in ACTIONS:
-				action_value[((row, col), a)] = 0
+	action_value = QTable(STATES, ACTIONS)
 
 	action_value, steps, _ = sarsa(action_value, policy, env, step_size, discount, epochs)
 	fig, ax = plt.subplots()
@@ -119,12 +129,9 @@ if __name__ == "__main__":
 	plot_policy(opt_pol, action_value, " (Traditional)")
 
 	# king's moves windy gridworld
+	env = windy_table(KING_ACTIONS)
 	policy = lambda s, avs: eps_greedy(s, avs, KING_ACTIONS, eps)
-	action_value = {}
-	for row in range(DIMENSIONS[0]):
-		for col in range(DIMENSIONS[1]):
-			for a in KING_ACTIONS:
-				action_value[((row, col), a)] = 0
+	action_value = QTable(STATES, KING_ACTIONS)
 
 	action_value, steps, _ = sarsa(action_value, policy, env, step_size, discount, epochs)
 	fig, ax = plt.subplots()
@@ -136,13 +143,9 @@ if __name__ == "__main__":
 	plot_policy(opt_pol, action_value, " (King's Moves)")
 
 	# king's moves + stochastic windy gridworld
-	env = lambda s, a: stochastic_windy_gridworld(s, a)
+	env = windy_table(KING_ACTIONS, stochastic=True)
 	policy = lambda s, avs: eps_greedy(s, avs, KING_ACTIONS, eps)
-	action_value = {}
-	for row in range(DIMENSIONS[0]):
-		for col in range(DIMENSIONS[1]):
-			for a in KING_ACTIONS:
-				action_value[((row, col), a)] = 0
+	action_value = QTable(STATES, KING_ACTIONS)
 
 	action_value, steps, _ = sarsa(action_value, policy, env, step_size, discount, epochs)
 	fig, ax = plt.subplots()
@@ -0,0 +1,114 @@
+import csv
+import os
+from itertools import product
+from multiprocessing import Pool, cpu_count
+from sys import argv
+from zlib import crc32
+import numpy as np
+from matplotlib import pyplot as plt
+from tabular import lockstep_td_control
+from cliff_walking import cliff_table
+
+# sweep names -> (td method, vanishing eps)
+ALGORITHMS = {"sarsa": ("sarsa", False),
+			  "q_learn": ("q_learning", False),
+			  "expected_sarsa": ("expected_sarsa", False),
+			  "vanishing_sarsa": ("sarsa", True),
+			  "vanishing_q_learn": ("q_learning", True),
+			  "vanishing_expected_sarsa": ("expected_sarsa", True)}
+FIELDS = ["algorithm", "step_size", "eps", "discount", "block", "runs", "episodes", "interim", "asymptotic"]
+
+def _init_worker(env):
+	global _ENV
+	_ENV = env
+
+def task_seed(seed, key):
+	# a stream that depends only on the sweep seed and the task itself, so
+	# a resumed sweep draws the same numbers for the tasks it still runs
+	return np.random.SeedSequence(seed, spawn_key=(crc32(repr(key).encode()),))
+
+def _run(task):
+	key, runs, epochs, interim, seed = task
+	algorithm, step_size, eps, discount, block = key
+	method, vanishing = ALGORITHMS[algorithm]
+	rng = np.random.default_rng(task_seed(seed, key))
+	_, rewards, _ = lockstep_td_control(_ENV, method, step_size, discount, epochs, eps, runs, rng, vanishing=vanishing)
+
+	return key + (runs, epochs, rewards[:, :interim].mean(), rewards.mean())
+
+def row_key(row):
+	return (row["algorithm"], float(row["step_size"]), float(row["eps"]), float(row["discount"]), int(row["block"]))
+
+def completed(path):
+	# keys of the tasks already in the table; a row cut short by an
+	# interrupted write is dropped first
+	if not os.path.exists(path):
+		return set()
+	with open(path, "rb+") as f:
+		data = f.read()
+		f.truncate(data.rfind(b"\n") + 1)
+	with open(path, newline="") as f:
+		return {row_key(row) for row in csv.DictReader(f)}
+
+def sweep(path, algorithms, step_sizes, eps, discounts, runs=100, block_size=25, epochs=500,
+		  interim=100, env=None, workers=None, seed=0):
+	# every grid point is run `runs` times, in blocks of block_size lockstep
+	# agents per task; results are appended to the csv at path as they come
+	for algorithm in algorithms:
+		assert(algorithm in ALGORITHMS)
+	env = cliff_table() if env is None else env
+	done = completed(path)
+	blocks = range(int(np.ceil(runs / block_size)))
+	tasks = []
+	grid = product(algorithms, map(float, step_sizes), map(float, eps), map(float, discounts), blocks)
+	for key in grid:
+		if key not in done:
+			block_runs = min(block_size, runs - key[4] * block_size)
+			tasks.append((key, block_runs, epochs, interim, seed))
+
+	new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+	with open(path, "a", newline="") as f, Pool(workers or cpu_count(), _init_worker, (env,)) as pool:
+		writer = csv.writer(f)
+		if new_file:
+			writer.writerow(FIELDS)
+		for result in pool.imap_unordered(_run, tasks):
+			writer.writerow([repr(float(value)) if isinstance(value, float) else value for value in result])
+			f.flush()
+
+	return len(tasks)
+
+def load_sweep(path):
+	# run-weighted means of the blocks of each grid point
+	totals = {}
+	with open(path, newline="") as f:
+		for row in csv.DictReader(f):
+			config = row_key(row)[:4]
+			runs = int(row["runs"])
+			total = totals.setdefault(config, np.zeros(3))
+			total += [runs, runs * float(row["interim"]), runs * float(row["asymptotic"])]
+
+	return {config: (float(total[1] / total[0]), float(total[2] / total[0]), int(total[0])) for config, total in totals.items()}
+
+def plot_sweep(path, title=""):
+	results = load_sweep(path)
+	fig, ax = plt.subplots()
+	for algorithm, eps, discount in sorted({(c[0], c[2], c[3]) for c in results}):
+		step_sizes = sorted(c[1] for c in results if (c[0], c[2], c[3]) == (algorithm, eps, discount))
+		label = r"{0} ($\epsilon$={1}, $\gamma$={2})".format(algorithm, eps, discount)
+		interim = [results[(algorithm, a, eps, discount)][0] for a in step_sizes]
+		asymptotic = [results[(algorithm, a, eps, discount)][1] for a in step_sizes]
+		line, = ax.plot(step_sizes, asymptotic, lw=2, label="Asymptotic " + label)
+		ax.plot(step_sizes, interim, lw=2, ls="--", c=line.get_color(), label="Interim " + label)
+	ax.set_xlabel(r"Step Size ($\alpha$)")
+	ax.set_ylabel("Sum of Rewards per Episode")
+	ax.set_title("Interim and Asymptotic Performance" + title)
+	ax.legend()
+
+if __name__ == "__main__":
+	assert(len(argv) >= 2)
+	path = argv[1]
+	epochs = int(argv[2]) if len(argv) > 2 else 1000
+	sweep(path, ["sarsa", "q_learn", "expected_sarsa"], np.round(np.linspace(0.1, 1, 10), 2).tolist(),
+		  [0.1], [1.], epochs=epochs)
+	plot_sweep(path, " (Cliff Walking)")
+	plt.show()
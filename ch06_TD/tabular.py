@@ -0,0 +1,205 @@
+import numpy as np
+from bisect import bisect
+from collections.abc import MutableMapping
+from itertools import product
+
+METHODS = ["sarsa", "q_learning", "expected_sarsa"]
+
+class TabularEnv:
+	# dynamics precomputed over integer states and actions: outcome k of
+	# action a in state s, which happens with probability probs[k], leads to
+	# next_state[s, a, k] with reward rewards[s, a, k]
+	def __init__(self, states, actions, dynamics, initial_state, terminal_state, outcomes=(None,), probs=None):
+		self.states = list(states)
+		self.actions = list(actions)
+		self.state_index = {s: i for i, s in enumerate(self.states)}
+		self.action_index = {a: i for i, a in enumerate(self.actions)}
+		shape = (len(self.states), len(self.actions), len(outcomes))
+		self.next_state = np.zeros(shape, dtype=np.int64)
+		self.rewards = np.zeros(shape)
+		for (i, s), (j, a), (k, o) in product(enumerate(self.states), enumerate(self.actions), enumerate(outcomes)):
+			next_s, r = dynamics(s, a, o)
+			self.next_state[i, j, k] = self.state_index[next_s]
+			self.rewards[i, j, k] = r
+		self.probs = np.full(len(outcomes), 1 / len(outcomes)) if probs is None else np.asarray(probs)
+		self.initial = self.state_index[initial_state]
+		self.terminal = self.state_index[terminal_state]
+		# plain lists, which are cheaper than arrays for scalar lookups
+		self.cumulative = np.cumsum(self.probs).tolist()
+		self.next_list = self.next_state.tolist()
+		self.reward_list = self.rewards.tolist()
+
+	def step(self, s, a, u=None):
+		# u is a uniform draw that picks the outcome
+		k = 0
+		if len(self.cumulative) > 1:
+			u = np.random.random() if u is None else u
+			k = min(bisect(self.cumulative, u), len(self.cumulative) - 1)
+
+		return self.next_list[s][a][k], self.reward_list[s][a][k]
+
+	def outcomes(self, u):
+		# vectorized outcome choice for an array of uniform draws
+		return np.minimum(np.searchsorted(self.cumulative, u, side="right"), len(self.cumulative) - 1)
+
+	def __call__(self, state, action):
+		# drop-in for the environments on (row, col) states and action names
+		next_s, r = self.step(self.state_index[state], self.action_index[action])
+		return self.states[next_s], r
+
+class QTable(MutableMapping):
+	# action values as a (states, actions) array that can still be indexed
+	# like the dicts keyed by (state, action) the TD functions use
+	def __init__(self, states, actions, Q=None):
+		self.states = list(states)
+		self.actions = list(actions)
+		self.state_index = {s: i for i, s in enumerate(self.states)}
+		self.action_index = {a: i for i, a in enumerate(self.actions)}
+		self.Q = np.zeros((len(self.states), len(self.actions))) if Q is None else Q
+
+	def __getitem__(self, key):
+		state, action = key
+		return self.Q[self.state_index[state], self.action_index[action]]
+
+	def __setitem__(self, key, value):
+		state, action = key
+		self.Q[self.state_index[state], self.action_index[action]] = value
+
+	def __delitem__(self, key):
+		raise KeyError(key)
+
+	def __iter__(self):
+		return iter(product(self.states, self.actions))
+
+	def __len__(self):
+		return self.Q.size
+
+	def row(self, state, actions=None):
+		row = self.Q[self.state_index[state]]
+		if actions is None or actions is self.actions or actions == self.actions:
+			return row
+		return row[[self.action_index[a] for a in actions]]
+
+def greedy_action(row, rng):
+	# ties are broken at random
+	best = np.flatnonzero(row == row.max())
+	return best[0] if len(best) == 1 else best[rng.integers(len(best))]
+
+def vanishing_eps(eps, greedy_steps):
+	# as vanishing_eps_greedy: exploration decays with the greedy choices made
+	return eps / (0.1 * greedy_steps + 1)
+
+def expected_value(row, eps):
+	# value of the eps-greedy policy over row
+	return (1 - eps) * row.max() + eps * row.mean()
+
+def td_control(Q, env, method, step_size, discount, epochs, eps, rng=None, vanishing=False):
+	# SARSA, Q-learning or expected SARSA with eps-greedy behaviour on an
+	# integer (states, actions) array over a TabularEnv; returns the same
+	# steps and per-episode rewards as the functions on dicts
+	assert(method in METHODS)
+	rng = np.random.default_rng() if rng is None else rng
+	greedy_steps = 0
+
+	def choose(row):
+		nonlocal greedy_steps
+		current_eps = vanishing_eps(eps, greedy_steps) if vanishing else eps
+		if rng.random() < current_eps:
+			return rng.integers(len(row))
+		greedy_steps += 1
+		return greedy_action(row, rng)
+
+	steps = [0]
+	rewards = []
+	for ep in range(epochs):
+		total_reward = 0
+		s = env.initial
+		a = choose(Q[s])
+		while s != env.terminal:
+			next_s, r = env.step(s, a, rng.random())
+			next_a = choose(Q[next_s]) if method == "sarsa" else None
+			if method == "sarsa":
+				target = Q[next_s, next_a]
+			elif method == "q_learning":
+				target = Q[next_s].max()
+			else:
+				target = expected_value(Q[next_s], vanishing_eps(eps, greedy_steps) if vanishing else eps)
+			Q[s, a] += step_size * (r + discount * target - Q[s, a])
+			s = next_s
+			# off-policy methods pick the next action after the update
+			a = next_a if next_a is not None else choose(Q[s])
+			steps.append(ep)
+			total_reward += r
+		rewards.append(total_reward)
+
+	return Q, steps, rewards
+
+def eps_greedy_actions(rows, eps, rng):
+	# one eps-greedy action per row of a (runs, actions) array, with ties
+	# broken at random; eps may differ per row; also returns which rows
+	# explored
+	greedy = rows == rows.max(axis=1, keepdims=True)
+	a = np.argmax(greedy * rng.random(rows.shape), axis=1)
+	explore = rng.random(len(rows)) < eps
+	a[explore] = rng.integers(rows.shape[1], size=explore.sum())
+
+	return a, explore
+
+def lockstep_td_control(env, method, step_size, discount, epochs, eps, runs, rng=None, Q=None, vanishing=False):
+	# td_control for `runs` independent agents at once, with action values
+	# in a (runs, states, actions) array; each agent starts its next episode
+	# as soon as it reaches the terminal state and drops out of the updates
+	# once it has played all of them; returns per-run, per-episode rewards
+	# and lengths
+	assert(method in METHODS)
+	rng = np.random.default_rng() if rng is None else rng
+	Q = np.zeros((runs,) + env.next_state.shape[:2]) if Q is None else Q
+	rewards = np.zeros((runs, epochs))
+	lengths = np.zeros((runs, epochs), dtype=np.int64)
+	greedy_steps = np.zeros(runs)
+
+	def agent_eps(agents):
+		return vanishing_eps(eps, greedy_steps[agents]) if vanishing else eps
+
+	def choose(agents, rows):
+		a, explore = eps_greedy_actions(rows, agent_eps(agents), rng)
+		greedy_steps[agents] += ~explore
+		return a
+
+	active = np.arange(runs)
+	ep = np.zeros(runs, dtype=np.int64)
+	s = np.full(runs, env.initial)
+	a = choose(active, Q[active, s])
+	while len(active):
+		k = env.outcomes(rng.random(len(active)))
+		next_s = env.next_state[s, a, k]
+		r = env.rewards[s, a, k]
+		next_rows = Q[active, next_s]
+		if method == "sarsa":
+			next_a = choose(active, next_rows)
+			target = next_rows[np.arange(len(active)), next_a]
+		elif method == "q_learning":
+			target = next_rows.max(axis=1)
+		else:
+			current_eps = agent_eps(active)
+			target = (1 - current_eps) * next_rows.max(axis=1) + current_eps * next_rows.mean(axis=1)
+		Q[active, s, a] += step_size * (r + discount * target - Q[active, s, a])
+		rewards[active, ep] += r
+		lengths[active, ep] += 1
+
+		# agents that reached the terminal state restart from the initial one
+		ended = next_s == env.terminal
+		ep[ended] += 1
+		next_s[ended] = env.initial
+		if method == "sarsa":
+			next_a[ended] = choose(active[ended], Q[active[ended], env.initial])
+		else:
+			next_a = choose(active, Q[active, next_s])
+
+		playing = ep < epochs
+		active = active[playing]
+		ep = ep[playing]
+		s = next_s[playing]
+		a = next_a[playing]
+
+	return Q, rewards, lengths